@@ -1,4 +1,5 @@
 import os.path
+import posixpath
 from copy import copy
 
 from django.conf import settings
@@ -9,9 +10,11 @@ from django.utils.functional import SimpleLazyObject
 
 from ..files import BaseIKFile
 from ..registry import generator_registry
+from .backends import CacheFileState
 from ..signals import content_required, existence_required
 from ..utils import (
-    generate, get_by_qname, get_logger, get_singleton, get_storage
+    generate, get_by_qname, get_logger, get_singleton, get_storage,
+    walk_storage
 )
 
 
@@ -88,6 +91,55 @@ class ImageCacheFile(BaseIKFile, ImageFile):
     def url(self):
         return self._storage_attr('url')
 
+    # The dimensions and size of the file are answered from the metadata the
+    # cache file backend recorded when it generated the file, if any, so that
+    # the storage doesn't need to be consulted. Failing that, the generator
+    # may be able to predict the dimensions, which lets them be known before
+    # an asynchronous backend has generated the file.
+
+    def _get_metadata(self):
+        get_metadata = getattr(self.cachefile_backend, 'get_metadata', None)
+        if get_metadata is None:
+            return None
+        if getattr(self, '_file', None) is None:
+            existence_required.send(sender=self, file=self)
+        return get_metadata(self)
+
+    def _get_image_dimensions(self):
+        if not hasattr(self, '_dimensions_cache'):
+            metadata = self._get_metadata()
+            if metadata and metadata.get('width') is not None:
+                self._dimensions_cache = (metadata['width'],
+                                          metadata['height'])
+            else:
+                size = self._get_predicted_size()
+                if size is not None:
+                    self._dimensions_cache = size
+        return super()._get_image_dimensions()
+
+    def _get_predicted_size(self):
+        get_output_size = getattr(self.generator, 'get_output_size', None)
+        if get_output_size is None:
+            return None
+        return get_output_size()
+
+    @property
+    def size(self):
+        metadata = self._get_metadata()
+        if metadata and metadata.get('size') is not None:
+            return metadata['size']
+        return super().size
+
+    @property
+    def failed(self):
+        """
+        Whether the file failed to generate and the cache file backend won't
+        try again yet.
+
+        """
+        is_failed = getattr(self.cachefile_backend, 'is_failed', None)
+        return bool(self.name and is_failed and is_failed(self))
+
     def generate(self, force=False):
         """
         Generate the file. If ``force`` is ``True``, the file will be generated
@@ -141,6 +193,9 @@ class ImageCacheFile(BaseIKFile, ImageFile):
         # file exists. This gives the strategy a chance to create the file.
         existence_required.send(sender=self, file=self)
 
+        if self.failed:
+            return False
+
         try:
             check = self.cachefile_strategy.should_verify_existence(self)
         except AttributeError:
@@ -155,6 +210,12 @@ class ImageCacheFile(BaseIKFile, ImageFile):
         # file is hidden link to "file" attribute
         state.pop('_file', None)
 
+        # The state remembered by the backend may be stale by the time the
+        # file is unpickled.
+        state.pop('_cachefile_state', None)
+        state.pop('_cachefile_metadata', None)
+        state.pop('_generation_scheduled', None)
+
         # remove storage from state as some non-FileSystemStorage can't be
         # pickled
         settings_storage = get_storage()
@@ -173,6 +234,76 @@ class ImageCacheFile(BaseIKFile, ImageFile):
         )
 
 
+def prime_cachefiles(files):
+    """
+    Loads the state of many cache files at once, so that checking whether
+    each of them exists doesn't require its own cache lookup. Files whose
+    backends don't support this (i.e. don't have a ``get_states`` method) are
+    ignored.
+
+    """
+    by_backend = {}
+    for file in files:
+        if file is not None and getattr(file, 'name', None):
+            backend = file.cachefile_backend
+            by_backend.setdefault(id(backend), (backend, []))[1].append(file)
+    for backend, backend_files in by_backend.values():
+        get_states = getattr(backend, 'get_states', None)
+        if get_states is not None:
+            get_states(backend_files)
+
+
+def seed_cachefile_states(files, listings=None, path=None):
+    """
+    Sets the states of many cache files from a listing of their storage's
+    ``path`` directory (``IMAGEKIT_CACHEFILE_DIR`` by default), so that
+    checking whether each of them exists doesn't require its own request to the
+    storage. This is meant for bulk operations like ``generateimages``.
+
+    Each storage is listed once and the names are kept in ``listings``, a dict
+    mapping storages to sets of names, which is returned and can be passed to
+    later calls to avoid listing the storages again. Files outside of
+    ``path`` and files whose backends can't set states in bulk (i.e. don't
+    have a ``set_states`` method) are ignored.
+
+    Files that are missing from the listing are only marked as such on the
+    file objects, until they're generated, rather than in the cache (where
+    the state of missing files expires after a few seconds, which could be
+    long before a bulk operation gets to them).
+
+    """
+    if listings is None:
+        listings = {}
+    if path is None:
+        path = settings.IMAGEKIT_CACHEFILE_DIR
+    path = path.replace(os.sep, '/').strip('/')
+    prefix = path + '/' if path else ''
+
+    by_backend = {}
+    for file in files:
+        if file is None or not getattr(file, 'name', None):
+            continue
+        name = posixpath.normpath(file.name.replace(os.sep, '/'))
+        backend = file.cachefile_backend
+        if not name.startswith(prefix) \
+                or getattr(backend, 'set_states', None) is None:
+            continue
+        storage = file.storage
+        if storage not in listings:
+            listings[storage] = set(walk_storage(storage, path))
+        if name in listings[storage]:
+            by_backend.setdefault(id(backend), (backend, []))[1].append(
+                (file, CacheFileState.EXISTS))
+        else:
+            try:
+                file._cachefile_state = CacheFileState.DOES_NOT_EXIST
+            except AttributeError:
+                pass
+    for backend, file_states in by_backend.values():
+        backend.set_states(file_states)
+    return listings
+
+
 class LazyImageCacheFile(SimpleLazyObject):
     def __init__(self, generator_id, *args, **kwargs):
         def setup():
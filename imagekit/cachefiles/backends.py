@@ -1,16 +1,31 @@
+import multiprocessing
+import os
+import pickle
+import posixpath
+import threading
+import time
+import uuid
 import warnings
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
 from copy import copy
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 
-from ..utils import get_cache, get_singleton, sanitize_cache_key
+from ..exceptions import GenerationFailed
+from ..utils import (
+    TimedLRUCache, format_to_mimetype, get_cache, get_logger, get_singleton,
+    open_image, sanitize_cache_key
+)
 
 
 class CacheFileState:
     EXISTS = 'exists'
     GENERATING = 'generating'
     DOES_NOT_EXIST = 'does_not_exist'
+    FAILED = 'failed'
 
 
 def get_default_cachefile_backend():
@@ -27,6 +42,16 @@ class InvalidFileBackendError(ImproperlyConfigured):
     pass
 
 
+local_cache = TimedLRUCache(settings.IMAGEKIT_LOCAL_CACHE_SIZE,
+                            settings.IMAGEKIT_LOCAL_CACHE_TIMEOUT)
+"""
+An in-process cache in front of ``IMAGEKIT_CACHE_BACKEND``, holding the cache
+entries of files known to exist. Its ``hits`` and ``misses`` attributes count
+the lookups it did and didn't answer.
+
+"""
+
+
 class AbstractCacheFileBackend:
     """
     An abstract cache file backend. This isn't used by any internal classes and
@@ -52,6 +77,45 @@ class CachedFileBackend:
 
     """
 
+    generation_lock_timeout = 60
+    """
+    The maximum number of seconds a process may hold the lock for generating a
+    file. Only one process generates a given file at a time; the lock expires
+    after this long in case that process dies.
+
+    """
+
+    generation_wait_timeout = 10
+    """
+    The number of seconds to wait for another process to finish generating a
+    file before giving up. Strategies can opt out of waiting by defining a
+    ``should_wait_for_generation(file)`` method that returns ``False``.
+
+    """
+
+    generation_poll_interval = 0.1
+    """
+    The number of seconds between checks while waiting for another process to
+    generate a file.
+
+    """
+
+    failure_backoff = 30
+    """
+    The number of seconds to wait before retrying the generation of a file
+    that failed to generate (e.g. because its source is corrupt). The wait is
+    doubled after every consecutive failure, up to ``failure_max_backoff``
+    seconds.
+
+    """
+
+    failure_max_backoff = 3600
+    """
+    The maximum number of seconds to wait before retrying the generation of a
+    file that failed to generate.
+
+    """
+
     @property
     def cache(self):
         if not getattr(self, '_cache', None):
@@ -63,21 +127,241 @@ class CachedFileBackend:
         return sanitize_cache_key('%s%s-state' %
                                   (settings.IMAGEKIT_CACHE_PREFIX, file.name))
 
-    def get_state(self, file, check_if_unknown=True):
+    def _pack(self, state, metadata=None):
+        # The extra information is the metadata of files that exist and the
+        # details of failures. Entries without it are stored as bare states,
+        # which is what older versions stored.
+        return (state, metadata) if metadata else state
+
+    def _unpack(self, value):
+        if isinstance(value, (tuple, list)):
+            return value[0], value[1]
+        return value, None
+
+    def _get_cached(self, file):
         key = self.get_key(file)
-        state = self.cache.get(key)
+        value = None
+        if local_cache.maxsize:
+            value = local_cache.get(key)
+        if value is None:
+            value = self.cache.get(key)
+            self._set_local(key, value)
+        return self._unpack(value)
+
+    def _set_local(self, key, value):
+        # Only existence is cached locally; it's the only state that doesn't
+        # change on its own.
+        if not local_cache.maxsize:
+            return
+        if self._unpack(value)[0] == CacheFileState.EXISTS:
+            local_cache.set(key, value)
+        else:
+            local_cache.pop(key)
+
+    def get_state(self, file, check_if_unknown=True):
+        state = getattr(file, '_cachefile_state', None)
+        if state is not None:
+            return state
+        state, metadata = self._get_cached(file)
         if state is None and check_if_unknown:
-            exists = self._exists(file)
+            exists, metadata = self._lookup(file)
             state = CacheFileState.EXISTS if exists else CacheFileState.DOES_NOT_EXIST
-            self.set_state(file, state)
+            self.set_state(file, state, metadata)
+        else:
+            self._prime(file, state, metadata)
         return state
 
-    def set_state(self, file, state):
+    def set_state(self, file, state, metadata=None):
         key = self.get_key(file)
+        value = self._pack(state, metadata)
         if state == CacheFileState.DOES_NOT_EXIST:
-            self.cache.set(key, state, self.existence_check_timeout)
+            self.cache.set(key, value, self.existence_check_timeout)
         else:
-            self.cache.set(key, state, settings.IMAGEKIT_CACHE_TIMEOUT)
+            self.cache.set(key, value, settings.IMAGEKIT_CACHE_TIMEOUT)
+        self._set_local(key, value)
+        self._prime(file, state, metadata)
+
+    def get_metadata(self, file):
+        """
+        Returns the metadata recorded when the file was generated (a dict with
+        its ``width``, ``height``, ``size``, ``format`` and ``mimetype``), or
+        ``None`` if the file isn't known to exist or nothing was recorded.
+
+        """
+        metadata = getattr(file, '_cachefile_metadata', None)
+        if metadata is not None:
+            return metadata
+        state, metadata = self._get_cached(file)
+        if state != CacheFileState.EXISTS:
+            return None
+        self._prime(file, state, metadata)
+        return metadata
+
+    def get_failure(self, file):
+        """
+        Returns the details of the last failure to generate the file (a dict
+        with the qualified name of the ``exception`` class, the number of
+        consecutive ``failures`` and the timestamp after which generation may
+        be retried, ``retry_at``), or ``None`` if it's not in the failed state.
+
+        """
+        if getattr(file, '_cachefile_state', None) == CacheFileState.EXISTS:
+            return None
+        state, failure = self._get_cached(file)
+        if state != CacheFileState.FAILED:
+            # Save whoever asks next (e.g. ``exists()``) the lookup.
+            self._prime(file, state, failure)
+            return None
+        return failure
+
+    def is_failed(self, file):
+        """
+        Returns ``True`` if the file failed to generate and it's not time to
+        retry yet.
+
+        """
+        failure = self.get_failure(file)
+        return failure is not None and failure['retry_at'] > time.time()
+
+    def record_failure(self, file, exception, previous_failures=0):
+        """
+        Puts the file in the failed state. ``previous_failures`` is the number
+        of consecutive failures before this one, which determines how long to
+        wait before retrying.
+
+        """
+        failures = previous_failures + 1
+        backoff = min(self.failure_backoff * 2 ** (failures - 1),
+                      self.failure_max_backoff)
+        exception_class = type(exception)
+        self.set_state(file, CacheFileState.FAILED, {
+            'exception': '%s.%s' % (exception_class.__module__,
+                                    exception_class.__qualname__),
+            'failures': failures,
+            'retry_at': time.time() + backoff,
+        })
+
+    def _check_failure(self, file):
+        failure = self.get_failure(file)
+        if failure is not None and failure['retry_at'] > time.time():
+            raise GenerationFailed(
+                'Generating %s failed %s time(s) (%s); not retrying yet.' % (
+                    file.name, failure['failures'], failure['exception']),
+                failure)
+
+    def read_metadata(self, file):
+        """
+        Reads the metadata of a file that has just been generated from its
+        contents (which are still in memory), returning ``None`` if they
+        can't be read. Only the header of the image is parsed.
+
+        """
+        content = getattr(file, '_file', None)
+        if content is None:
+            return None
+        try:
+            content.seek(0)
+            img = open_image(content)
+            width, height = img.size
+            format = img.format
+            size = content.size
+            content.seek(0)
+        except Exception:
+            return None
+        return {
+            'width': width,
+            'height': height,
+            'size': size,
+            'format': format,
+            'mimetype': format_to_mimetype(format) if format else None,
+        }
+
+    def get_states(self, files, check_if_unknown=True):
+        """
+        Returns a list of the states of the provided files, using a single
+        cache lookup for all of them (and, if ``check_if_unknown`` is true, a
+        bulk existence check for those whose state isn't cached). Files that
+        exist remember it, so subsequent calls to ``get_state()`` for them won't
+        hit the cache.
+
+        """
+        files = list(files)
+        keys = [self.get_key(file) for file in files]
+        cached = {}
+        if local_cache.maxsize:
+            for key in keys:
+                value = local_cache.get(key)
+                if value is not None:
+                    cached[key] = value
+        remaining = [key for key in keys if key not in cached]
+        if remaining:
+            fetched = self.cache.get_many(remaining)
+            for key in remaining:
+                self._set_local(key, fetched.get(key))
+            cached.update(fetched)
+        values = [self._unpack(cached.get(key)) for key in keys]
+        states = [getattr(file, '_cachefile_state', None) or state
+                  for file, (state, _) in zip(files, values)]
+
+        if check_if_unknown:
+            unknown = [i for i, state in enumerate(states) if state is None]
+            if unknown:
+                found = self._lookup_many([files[i] for i in unknown])
+                for i, (exists, metadata) in zip(unknown, found):
+                    states[i] = (CacheFileState.EXISTS if exists
+                                 else CacheFileState.DOES_NOT_EXIST)
+                    values[i] = (states[i], metadata)
+                self.set_states((files[i], states[i], values[i][1])
+                                for i in unknown)
+
+        for file, state, (_, metadata) in zip(files, states, values):
+            self._prime(file, state, metadata)
+        return states
+
+    def set_states(self, file_states):
+        """
+        Sets the states of several files at once. ``file_states`` is an
+        iterable of ``(file, state)`` or ``(file, state, metadata)`` tuples.
+
+        """
+        missing, other = {}, {}
+        for file, state, *metadata in file_states:
+            metadata = metadata[0] if metadata else None
+            values = missing if state == CacheFileState.DOES_NOT_EXIST else other
+            key = self.get_key(file)
+            values[key] = self._pack(state, metadata)
+            self._set_local(key, values[key])
+            self._prime(file, state, metadata)
+        if missing:
+            self.cache.set_many(missing, self.existence_check_timeout)
+        if other:
+            self.cache.set_many(other, settings.IMAGEKIT_CACHE_TIMEOUT)
+
+    def _prime(self, file, state, metadata=None):
+        # Only existence is remembered by the file object; other states are
+        # expected to change soon.
+        try:
+            if state == CacheFileState.EXISTS:
+                file._cachefile_state = state
+                if metadata:
+                    file._cachefile_metadata = metadata
+            else:
+                file.__dict__.pop('_cachefile_state', None)
+                file.__dict__.pop('_cachefile_metadata', None)
+        except AttributeError:
+            pass
+
+    def _exists_many(self, files):
+        return [self._exists(file) for file in files]
+
+    # Backends that keep a record of generated files can override these to
+    # provide the files' metadata along with their existence.
+
+    def _lookup(self, file):
+        return self._exists(file), None
+
+    def _lookup_many(self, files):
+        return [(exists, None) for exists in self._exists_many(files)]
 
     def __getstate__(self):
         state = copy(self.__dict__)
@@ -92,12 +376,110 @@ class CachedFileBackend:
     def generate(self, file, force=False):
         raise NotImplementedError
 
+    def get_lock_key(self, file):
+        from django.conf import settings
+        return sanitize_cache_key('%s%s-lock' %
+                                  (settings.IMAGEKIT_CACHE_PREFIX, file.name))
+
+    def acquire_lock(self, file):
+        """
+        Tries to acquire the lock for generating the file, returning a token
+        identifying the owner of the lock if successful, and ``None``
+        otherwise. Since ``cache.add()`` is atomic, only one process can hold
+        the lock at a time (as long as they share the cache). The lock expires
+        after ``generation_lock_timeout`` seconds in case its owner dies.
+
+        """
+        token = uuid.uuid4().hex
+        if self.cache.add(self.get_lock_key(file), token,
+                          self.generation_lock_timeout):
+            return token
+        return None
+
+    def release_lock(self, file, token):
+        key = self.get_lock_key(file)
+        # Make sure we don't release a lock that expired and was then acquired
+        # by somebody else. (This isn't atomic, but the window is small.)
+        if self.cache.get(key) == token:
+            self.cache.delete(key)
+
+    def is_locked(self, file):
+        return self.cache.get(self.get_lock_key(file)) is not None
+
+    def get_generation_wait_timeout(self, file):
+        try:
+            should_wait = file.cachefile_strategy.should_wait_for_generation
+        except AttributeError:
+            return self.generation_wait_timeout
+        return self.generation_wait_timeout if should_wait(file) else 0
+
+    def wait_for_generation(self, file, timeout):
+        """
+        Waits up to ``timeout`` seconds for another process to finish
+        generating the file. Returns ``True`` if the file was generated and
+        ``False`` otherwise.
+
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            state, metadata = self._get_cached(file)
+            if state == CacheFileState.EXISTS:
+                self._prime(file, state, metadata)
+                return True
+            if not self.is_locked(file) or time.monotonic() >= deadline:
+                return False
+            time.sleep(min(self.generation_poll_interval,
+                           max(deadline - time.monotonic(), 0)))
+
     def generate_now(self, file, force=False):
-        if force or self.get_state(file) not in (CacheFileState.GENERATING, CacheFileState.EXISTS):
+        """
+        Generates the file in the current thread, unless it already exists (or
+        another process holds the lock for generating it). Returns whether the
+        file was generated.
+
+        """
+        if not force:
+            state = self.get_state(file)
+            if state == CacheFileState.EXISTS:
+                return False
+            elif state == CacheFileState.FAILED:
+                # Don't waste time on a file that can't be generated (e.g.
+                # because its source is corrupt) until it's time to retry.
+                self._check_failure(file)
+
+        token = self.acquire_lock(file)
+        if token is None:
+            # Somebody else is generating the file, so there's no need for us
+            # to do it too.
+            timeout = self.get_generation_wait_timeout(file)
+            if timeout:
+                self.wait_for_generation(file, timeout)
+            return False
+
+        try:
+            # The file may have been generated while we were acquiring the
+            # lock.
+            state, info = self._get_cached(file)
+            if not force and state == CacheFileState.EXISTS:
+                self._prime(file, state, info)
+                return False
+            previous_failures = (info['failures']
+                                 if state == CacheFileState.FAILED else 0)
             self.set_state(file, CacheFileState.GENERATING)
-            file._generate()
-            self.set_state(file, CacheFileState.EXISTS)
+            try:
+                file._generate()
+            except Exception as e:
+                self.record_failure(file, e, previous_failures)
+                raise
+            # Recording the metadata of the file saves the storage roundtrip
+            # needed to read it later (e.g. for the width and height of
+            # thumbnails).
+            self.set_state(file, CacheFileState.EXISTS,
+                           self.read_metadata(file))
             file.close()
+            return True
+        finally:
+            self.release_lock(file, token)
 
 
 class Simple(CachedFileBackend):
@@ -107,6 +489,19 @@ class Simple(CachedFileBackend):
 
     """
 
+    listdir_threshold = None
+    """
+    The number of files of the same directory that must be checked at once
+    (e.g. by ``prime_cachefiles``) for the directory to be listed instead of
+    checking each of them. Listing is much cheaper than checking many files
+    with remote storages, but costs as much as the size of the directory, so
+    it's disabled by default; enable it when the files of the same source are
+    generated in a directory of their own (e.g. with the default
+    ``IMAGEKIT_SPEC_CACHEFILE_NAMER``) rather than all in one (as with the
+    default ``IMAGEKIT_CACHEFILE_NAMER``).
+
+    """
+
     def generate(self, file, force=False):
         self.generate_now(file, force=force)
 
@@ -114,6 +509,135 @@ class Simple(CachedFileBackend):
         return bool(getattr(file, '_file', None)
                     or (file.name and file.storage.exists(file.name)))
 
+    def _exists_many(self, files):
+        if not self.listdir_threshold:
+            return super()._exists_many(files)
+
+        # Files in the same directory are checked by listing the directory
+        # once, which is much cheaper than checking each file with remote
+        # storages.
+        groups = {}
+        for i, file in enumerate(files):
+            if file.name and not getattr(file, '_file', None):
+                dirname, basename = posixpath.split(file.name.replace(os.sep, '/'))
+                groups.setdefault((file.storage, dirname), []).append((i, basename))
+
+        results = [bool(getattr(file, '_file', None)) for file in files]
+        for (storage, dirname), items in groups.items():
+            if len(items) < max(self.listdir_threshold, 2):
+                for i, _ in items:
+                    results[i] = self._exists(files[i])
+                continue
+            try:
+                names = set(storage.listdir(dirname)[1])
+            except FileNotFoundError:
+                names = set()
+            except (NotImplementedError, OSError):
+                for i, _ in items:
+                    results[i] = self._exists(files[i])
+                continue
+            for i, basename in items:
+                results[i] = basename in names
+        return results
+
+
+class Manifest(Simple):
+    """
+    A backend that records generated files in a database table (which
+    requires ``'imagekit.manifest'`` in your ``INSTALLED_APPS``), along with
+    their generator id, source name, metadata and generation time. The state
+    cache is only used as a read-through layer, so losing it doesn't mean
+    checking the storage for every file again: files missing from the cache are
+    looked up with a single query per batch. Files that aren't in the manifest
+    are checked in the storage (and recorded, if they exist) so that files
+    generated before switching to this backend aren't regenerated.
+
+    """
+
+    database = None
+    """The alias of the database holding the manifest."""
+
+    query_chunk_size = 500
+    """The maximum number of names looked up with a single query."""
+
+    @property
+    def entries(self):
+        try:
+            from ..manifest.models import ManifestEntry
+        except RuntimeError:
+            raise ImproperlyConfigured(
+                "The Manifest cache file backend requires 'imagekit.manifest'"
+                " in INSTALLED_APPS.")
+        return ManifestEntry.objects.using(self.database)
+
+    def get_entries(self, names):
+        """
+        Returns a dict of the manifest entries for the provided file names.
+
+        """
+        names = list(names)
+        found = {}
+        for i in range(0, len(names), self.query_chunk_size):
+            chunk = names[i:i + self.query_chunk_size]
+            for entry in self.entries.filter(name__in=chunk):
+                found[entry.name] = entry
+        return found
+
+    def _get_entry_fields(self, file, metadata=None):
+        generator = file.generator
+        registry_args = getattr(generator, '_registry_args', None)
+        source = getattr(generator, 'source', None)
+        metadata = metadata or {}
+        return {
+            'generator_id': registry_args[0] if registry_args else '',
+            'source_name': getattr(source, 'name', None) or '',
+            'width': metadata.get('width'),
+            'height': metadata.get('height'),
+            'size': metadata.get('size'),
+            'format': metadata.get('format') or '',
+            'mimetype': metadata.get('mimetype') or '',
+        }
+
+    def record(self, file, metadata=None):
+        """
+        Records the file in the manifest, replacing any existing entry.
+
+        """
+        from django.utils import timezone
+        defaults = self._get_entry_fields(file, metadata)
+        defaults['generated_at'] = timezone.now()
+        self.entries.update_or_create(name=file.name, defaults=defaults)
+
+    def set_state(self, file, state, metadata=None):
+        if state == CacheFileState.EXISTS and metadata is not None:
+            # Only files we've just generated come with metadata; the others
+            # were found in the manifest or recorded when they were found.
+            self.record(file, metadata)
+        super().set_state(file, state, metadata)
+
+    def _lookup(self, file):
+        return self._lookup_many([file])[0]
+
+    def _lookup_many(self, files):
+        files = list(files)
+        entries = self.get_entries({file.name for file in files if file.name})
+        results = [(True, entries[file.name].get_metadata())
+                   if file.name in entries else None for file in files]
+
+        unknown = [i for i, result in enumerate(results) if result is None]
+        if unknown:
+            existing = self._exists_many([files[i] for i in unknown])
+            new_entries = []
+            for i, exists in zip(unknown, existing):
+                results[i] = (exists, None)
+                if exists:
+                    new_entries.append(self.entries.model(
+                        name=files[i].name,
+                        **self._get_entry_fields(files[i])))
+            if new_entries:
+                self.entries.bulk_create(new_entries, ignore_conflicts=True)
+        return results
+
 
 def _generate_file(backend, file, force=False):
     backend.generate_now(file, force=force)
@@ -125,15 +649,30 @@ class BaseAsync(Simple):
     """
     is_async = True
 
+    # Nobody is waiting for the result, so there's no point in waiting for
+    # somebody else to generate a file.
+    generation_wait_timeout = 0
+
     def generate(self, file, force=False):
         # Schedule the file for generation, unless we know for sure we don't
         # need to. If an already-generated file sneaks through, that's okay;
         # ``generate_now`` will catch it. We just want to make sure we don't
         # schedule anything we know is unnecessary--but we also don't want to
         # force a costly existence check.
+        # The same file object also doesn't need to be scheduled twice.
+        if not force and getattr(file, '_generation_scheduled', False):
+            return None
         state = self.get_state(file, check_if_unknown=False)
+        if not force and state == CacheFileState.FAILED \
+                and self.is_failed(file):
+            return None
         if state not in (CacheFileState.GENERATING, CacheFileState.EXISTS):
-            self.schedule_generation(file, force=force)
+            result = self.schedule_generation(file, force=force)
+            try:
+                file._generation_scheduled = True
+            except AttributeError:
+                pass
+            return result
 
     def schedule_generation(self, file, force=False):
         # overwrite this to have the file generated in the background,
@@ -141,6 +680,327 @@ class BaseAsync(Simple):
         raise NotImplementedError
 
 
+class BaseExecutor(BaseAsync):
+    """
+    Base class for backends that generate files using a
+    ``concurrent.futures`` executor in the current process. Concurrent requests
+    for the same file are collapsed into a single job.
+
+    """
+    max_workers = None
+    """
+    The maximum number of workers used to generate images. Defaults to the
+    default of the executor.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._setup()
+
+    def _setup(self):
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.RLock()
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = self.create_executor()
+            return self._executor
+
+    def create_executor(self):
+        raise NotImplementedError
+
+    def submit(self, file, force=False):
+        """
+        Submits the generation of the file to the executor, returning a
+        ``Future``.
+
+        """
+        raise NotImplementedError
+
+    def schedule_generation(self, file, force=False):
+        """
+        Schedules the generation of the file, unless it's already scheduled,
+        and returns a ``concurrent.futures.Future`` for the job.
+
+        """
+        with self._lock:
+            future = self._futures.get(file.name)
+            if future is None:
+                future = self.submit(file, force=force)
+                self._futures[file.name] = future
+                future.add_done_callback(
+                    lambda f, name=file.name: self._discard_future(name, f))
+            return future
+
+    def _discard_future(self, name, future):
+        with self._lock:
+            if self._futures.get(name) is future:
+                del self._futures[name]
+
+    def get_future(self, file):
+        """
+        Returns the ``Future`` for the scheduled or running generation of the
+        file, or ``None`` if there is none.
+
+        """
+        with self._lock:
+            return self._futures.get(file.name)
+
+    def wait(self, file, timeout=None):
+        """
+        Waits for the scheduled or running generation of the file to finish,
+        raising ``concurrent.futures.TimeoutError`` if it doesn't finish within
+        ``timeout`` seconds. Exceptions raised during generation are
+        re-raised.
+
+        Jobs are forgotten as soon as they finish, so this returns right away
+        (without raising) if the generation has already finished, whether or
+        not it succeeded; use ``get_failure()`` to find out whether it failed.
+
+        """
+        future = self.get_future(file)
+        if future is not None:
+            future.result(timeout=timeout)
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        for key in ('_executor', '_futures', '_lock', '_source_locks'):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._setup()
+
+
+class ThreadPool(BaseExecutor):
+    """
+    A backend that generates images in a pool of threads in the current
+    process, so no message broker is needed.
+
+    Pillow releases the GIL while decoding, resizing and encoding, so the
+    threads can make use of several cores.
+
+    """
+    def _setup(self):
+        super()._setup()
+        self._source_locks = weakref.WeakKeyDictionary()
+
+    def create_executor(self):
+        return ThreadPoolExecutor(max_workers=self.max_workers,
+                                  thread_name_prefix='imagekit')
+
+    def submit(self, file, force=False):
+        # The specs of a source usually share its file object, which workers
+        # can't read at the same time (each opens, reads and closes it). So
+        # the worker gets a copy of the file whose source has a file object of
+        # its own or, if the source can't be reopened that way, takes turns
+        # with the other jobs for the same source.
+        own_file = copy_with_own_source(file)
+        if own_file is not None:
+            return self.executor.submit(self._generate_file, own_file, force)
+        return self.executor.submit(self._generate_file, copy(file), force,
+                                    self._get_source_lock(file))
+
+    def _get_source_lock(self, file):
+        source = file.generator.source
+        with self._lock:
+            try:
+                return self._source_locks.setdefault(source,
+                                                     threading.Lock())
+            except TypeError:
+                # The source can't be weakly referenced, so all such sources
+                # share a lock.
+                return self._source_locks.setdefault(self, threading.Lock())
+
+    def _generate_file(self, file, force, source_lock=None):
+        from django.db import connection
+        try:
+            with source_lock or nullcontext():
+                self.generate_now(file, force=force)
+        except Exception:
+            get_logger().exception('Failed to generate %s', file.name)
+            raise
+        finally:
+            # Django won't clean up connections opened outside of requests.
+            connection.close()
+
+
+def copy_with_own_source(file):
+    """
+    Returns a copy of a cache file whose generator reads its source through a
+    file object of its own, or ``None`` if the source can't be reopened (only
+    sources that are file fields of model instances can). Generators without
+    sources are shared.
+
+    """
+    generator = file.generator
+    source = getattr(generator, 'source', None)
+    if not source:
+        return copy(file)
+    field = getattr(source, 'field', None)
+    instance = getattr(source, 'instance', None)
+    if field is None or instance is None:
+        return None
+    generator = copy(generator)
+    generator.source = field.attr_class(instance, field, source.name)
+    file = copy(file)
+    file.generator = generator
+    return file
+
+
+def get_generation_payload(file):
+    """
+    Returns a small, picklable description of a cache file from which it can
+    be reconstructed (see ``generate_from_payload``), or ``None`` if it can't
+    be described that way. The generator must have been created by the
+    generator registry and its source, if any, must be a file field of a saved
+    model instance.
+
+    """
+    generator = file.generator
+    registry_args = getattr(generator, '_registry_args', None)
+    if registry_args is None:
+        return None
+    generator_id, kwargs = registry_args
+
+    source = getattr(generator, 'source', None)
+    source_info = None
+    if source is not None:
+        field = getattr(source, 'field', None)
+        instance = getattr(source, 'instance', None)
+        model = getattr(field, 'model', None)
+        if model is None or getattr(instance, 'pk', None) is None \
+                or not source.name:
+            return None
+        source_info = (model._meta.label, field.name, instance.pk,
+                       source.name)
+
+    payload = (generator_id, kwargs, source_info, file.name)
+    try:
+        pickle.dumps(payload)
+    except Exception:
+        return None
+    return payload
+
+
+def load_from_payload(payload):
+    """
+    Reconstructs a cache file from a payload created by
+    ``get_generation_payload``.
+
+    """
+    from django.apps import apps
+    from django.db import router
+    from . import ImageCacheFile
+    from ..registry import generator_registry
+
+    generator_id, kwargs, source_info, name = payload
+    kwargs = dict(kwargs)
+    if source_info is not None:
+        model_label, field_name, pk, source_name = source_info
+        model = apps.get_model(model_label)
+        field = model._meta.get_field(field_name)
+        # The payload has all that's needed to generate the file, so rather
+        # than querying each row again, the instance is rebuilt with every
+        # other field deferred (and loaded only if something uses it).
+        instance = model.from_db(router.db_for_read(model),
+                                 [model._meta.pk.attname], [pk])
+        kwargs['source'] = field.attr_class(instance, field, source_name)
+
+    generator = generator_registry.get(generator_id, **kwargs)
+    return ImageCacheFile(generator, name=name)
+
+
+def generate_from_payload(payload, force=False):
+    """
+    Reconstructs a cache file from a payload created by
+    ``get_generation_payload`` and generates it, returning the cache file.
+
+    """
+    file = load_from_payload(payload)
+    file.cachefile_backend.generate_now(file, force=force)
+    return file
+
+
+def _init_process_worker():
+    import django
+    django.setup()
+
+
+# These return whether the file was generated, along with its metadata.
+
+def _generate_in_process(payload, force=False):
+    from django.db import connections
+    try:
+        file = load_from_payload(payload)
+        generated = file.cachefile_backend.generate_now(file, force=force)
+        return generated, getattr(file, '_cachefile_metadata', None)
+    finally:
+        connections.close_all()
+
+
+def _generate_file_in_process(backend, file, force=False):
+    from django.db import connections
+    try:
+        generated = backend.generate_now(file, force=force)
+        return generated, getattr(file, '_cachefile_metadata', None)
+    finally:
+        connections.close_all()
+
+
+class ProcessPool(BaseExecutor):
+    """
+    A backend that generates images in a pool of worker processes, which is
+    useful for CPU-bound specs that don't scale well with threads. No message
+    broker is needed.
+
+    Instead of the cache file (along with its generator and source model
+    instance), workers are sent its generator id, the arguments the generator
+    was created with, the location of the source and the file name. Files that
+    can't be described that way are pickled in full, so their storages and
+    generators must be picklable (as with the ``Celery`` backend).
+
+    Workers are started with the ``start_method`` multiprocessing start
+    method and call ``django.setup()``, so your settings must be available
+    through the ``DJANGO_SETTINGS_MODULE`` environment variable.
+
+    """
+    start_method = 'spawn'
+
+    def create_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=_init_process_worker)
+
+    def submit(self, file, force=False):
+        payload = get_generation_payload(file)
+        if payload is not None:
+            future = self.executor.submit(_generate_in_process, payload, force)
+        else:
+            future = self.executor.submit(_generate_file_in_process, self,
+                                          file, force)
+        future.add_done_callback(
+            lambda f: self._generation_done(file, f))
+        return future
+
+    def _generation_done(self, file, future):
+        # The workers may not share our cache (e.g. if it's a local memory
+        # cache), so record the state (and the metadata the worker read)
+        # here too, if the worker did generate the file. (It doesn't if
+        # another process is generating it, in which case it may not exist
+        # yet.)
+        if not future.cancelled() and future.exception() is None:
+            generated, metadata = future.result()
+            if generated:
+                self.set_state(file, CacheFileState.EXISTS, metadata)
+
+
 try:
     from celery import shared_task as task
 except ImportError:
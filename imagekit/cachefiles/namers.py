@@ -6,10 +6,12 @@ choices.
 """
 
 import os
+from hashlib import sha256
 
 from django.conf import settings
 
-from ..utils import format_to_extension, suggest_extension
+from ..utils import (format_to_extension, get_cache, sanitize_cache_key,
+                     suggest_extension)
 
 
 def source_name_as_path(generator):
@@ -91,3 +93,101 @@ def hash(generator):
     ext = format_to_extension(format) if format else ''
     return os.path.normpath(os.path.join(settings.IMAGEKIT_CACHEFILE_DIR,
                                          '%s%s' % (generator.get_hash(), ext)))
+
+
+def get_source_digest(source, refresh=False):
+    """
+    Returns the SHA-256 hex digest of the contents of a source file. Since
+    computing it means reading the whole file, it's cached per source name (in
+    the ``IMAGEKIT_CACHE_BACKEND`` cache) as well as on the source object.
+    ``refresh`` ignores both, e.g. when a new file has been saved.
+
+    """
+    name = getattr(source, 'name', None)
+    memo = getattr(source, '_ik_source_digest', None)
+    # The memo is only valid as long as the source's name doesn't change
+    # (e.g. when a new file is saved to the same ``FieldFile``).
+    if memo is not None and memo[0] == name and not refresh:
+        return memo[1]
+
+    digest = None
+    key = name and sanitize_cache_key('%ssource_digest:%s' % (
+        settings.IMAGEKIT_CACHE_PREFIX, name))
+    if key and not refresh:
+        digest = get_cache().get(key)
+    if digest is None:
+        digest = _read_digest(source)
+        if key:
+            get_cache().set(key, digest, settings.IMAGEKIT_CACHE_TIMEOUT)
+    try:
+        source._ik_source_digest = (name, digest)
+    except AttributeError:
+        pass
+    return digest
+
+
+def _read_digest(source):
+    digest = sha256()
+    storage = getattr(source, 'storage', None)
+    if getattr(source, 'closed', False) and storage is not None:
+        # Read stored files from the storage, rather than reopening a file
+        # object that may have been closed for good (e.g. an upload).
+        with storage.open(source.name, 'rb') as f:
+            for chunk in f.chunks():
+                digest.update(chunk)
+    else:
+        for chunk in source.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_digest(generator):
+    """
+    A namer that names files after a digest of the contents of their source
+    (see ``get_source_digest``) and the settings of the generator. Sources
+    with identical contents (even if they have different names) therefore
+    share one cache file, which is only generated once. Given any source file
+    name, it will generate a name like this::
+
+        /path/to/generated/images/5f/5ff3233527c5ac3e4b596343b440ff67.jpg
+
+    where "/path/to/generated/images/" is the value specified by the
+    ``IMAGEKIT_CACHEFILE_DIR`` setting.
+
+    Source files are assumed not to be replaced by different contents under
+    the same name. (Digests are refreshed when a source is saved (see
+    ``refresh_source_digest``), but files generated from its previous
+    contents are still used until then.)
+
+    """
+    from ..specs import ImageSpec
+
+    source = getattr(generator, 'source', None)
+    if not source or not isinstance(generator, ImageSpec):
+        return hash(generator)
+
+    name = generator.get_hash(source_key=get_source_digest(source))
+    format = getattr(generator, 'format', None)
+    if format:
+        ext = format_to_extension(format)
+    else:
+        # The output format depends on the source.
+        ext = suggest_extension(getattr(source, 'name', None) or '', format)
+    return os.path.normpath(os.path.join(settings.IMAGEKIT_CACHEFILE_DIR,
+                                         name[:2], '%s%s' % (name, ext)))
+
+
+def refresh_source_digest(source):
+    """
+    Records the digest of a saved source when the ``source_digest`` namer is
+    used, so that it's known (and up to date, should the source have been
+    replaced under the same name) before its cache files are named.
+    ``ModelSignalRouter`` calls this once for every saved source, before
+    sending the ``source_saved`` signal; source groups of your own should do
+    the same.
+
+    """
+    namer = '%s.source_digest' % __name__
+    if namer in (settings.IMAGEKIT_SPEC_CACHEFILE_NAMER,
+                 settings.IMAGEKIT_CACHEFILE_NAMER):
+        get_source_digest(source, refresh=True)
@@ -8,7 +8,10 @@ class JustInTime:
     """
 
     def on_existence_required(self, file):
-        file.generate()
+        # Files that recently failed to generate are treated as missing
+        # instead of raising every time they're used.
+        if not file.failed:
+            file.generate()
 
     def on_content_required(self, file):
         file.generate()
@@ -28,6 +31,9 @@ class Optimistic:
     def should_verify_existence(self, file):
         return False
 
+    def should_wait_for_generation(self, file):
+        return False
+
 
 class DictStrategy:
     def __init__(self, callbacks):
@@ -6,6 +6,7 @@ from django.core.exceptions import ImproperlyConfigured
 class ImageKitConf(AppConf):
     CACHEFILE_NAMER = 'imagekit.cachefiles.namers.hash'
     SPEC_CACHEFILE_NAMER = 'imagekit.cachefiles.namers.source_name_as_path'
+    SPEC_HASHER = 'imagekit.hashers.pickle'
     CACHEFILE_DIR = 'CACHE/images'
     DEFAULT_CACHEFILE_BACKEND = 'imagekit.cachefiles.backends.Simple'
     DEFAULT_CACHEFILE_STRATEGY = 'imagekit.cachefiles.strategies.JustInTime'
@@ -16,6 +17,13 @@ class ImageKitConf(AppConf):
     CACHE_PREFIX = 'imagekit:'
     CACHE_TIMEOUT = None
     USE_MEMCACHED_SAFE_CACHE_KEY = True
+    LOCAL_CACHE_SIZE = 0
+    LOCAL_CACHE_TIMEOUT = 30
+
+    FAILED_IMAGE_URL = None
+
+    SHRINK_ON_LOAD = True
+    INTERMEDIATE_CACHE_SIZE = 10
 
     def configure_cache_backend(self, value):
         if value is None:
@@ -0,0 +1,396 @@
+"""
+Helpers for decoding source images no larger than the processors of a spec
+actually need. When the first thing a spec does is scale the image down, there's
+no point in decoding (and holding in memory) every pixel of the original; JPEGs
+can be decoded at a reduced scale directly (using ``Image.draft()``) and other
+formats can be cheaply reduced (using ``Image.reduce()``) before the expensive
+resampling done by the processors.
+
+This module also lets several specs share a single decoded copy of a source
+(see ``share_source``) so that, for example, saving a model with many
+``ImageSpecField``s doesn't decode the same original once per field. Specs that
+start with the same processors go one step further and share the intermediate
+image produced by those processors.
+
+"""
+
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import hashers
+from .processors import (ProcessorPipeline, Resize, ResizeToCover,
+                         ResizeToFill, ResizeToFit, SmartResize, Thumbnail,
+                         Transpose)
+from .utils import LRUCache, open_image
+
+REDUCING_GAP = 2.0
+"""
+How many times larger than the size produced by the first resize processor an
+image must remain after it has been shrunk on load. This serves the same purpose
+as the ``reducing_gap`` argument of Pillow's ``Image.thumbnail()``: the
+processors still do the final resampling, so the quality of the result is not
+affected.
+
+"""
+
+REDUCIBLE_MODES = ('L', 'LA', 'RGB', 'RGBA')
+
+
+def get_resize_size(processor, size):
+    """
+    Returns the size to which ``processor`` will scale (but not crop) an image
+    of the provided size, or ``None`` if that can't be determined.
+
+    """
+    width, height = size
+    if isinstance(processor, Thumbnail):
+        if processor.crop:
+            processor = ResizeToCover(processor.width, processor.height,
+                                      upscale=processor.upscale)
+        else:
+            processor = ResizeToFit(processor.width, processor.height,
+                                    upscale=processor.upscale)
+    elif isinstance(processor, (ResizeToFill, SmartResize)):
+        processor = ResizeToCover(processor.width, processor.height,
+                                  upscale=processor.upscale)
+
+    if isinstance(processor, Resize):
+        return processor.width, processor.height
+    elif isinstance(processor, ResizeToCover):
+        if not processor.width or not processor.height:
+            return None
+        ratio = max(float(processor.width) / width,
+                    float(processor.height) / height)
+    elif isinstance(processor, ResizeToFit):
+        if processor.width is not None and processor.height is not None:
+            ratio = min(float(processor.width) / width,
+                        float(processor.height) / height)
+        elif processor.width is not None:
+            ratio = float(processor.width) / width
+        elif processor.height is not None:
+            ratio = float(processor.height) / height
+        else:
+            return None
+    else:
+        return None
+    return int(round(width * ratio)), int(round(height * ratio))
+
+
+def _get_factor(size, target):
+    return int(min(size[0] / (target[0] * REDUCING_GAP),
+                   size[1] / (target[1] * REDUCING_GAP)))
+
+
+def _get_first_resize(processors):
+    """
+    Returns the first processor that isn't a ``Transpose`` (or ``None``), and
+    whether it's preceded by any.
+
+    """
+    transposed = False
+    for processor in processors or []:
+        if isinstance(processor, Transpose):
+            transposed = True
+        else:
+            return processor, transposed
+    return None, transposed
+
+
+def get_reduction_factor(processors, size):
+    """
+    Returns the largest integer factor by which an image of the provided size
+    can be shrunk before being passed to ``processors`` while staying large
+    enough for their first resize. Only leading ``Transpose`` processors are
+    looked past; if the first other processor isn't a known resize processor,
+    the factor is 1. (Since reduced sizes are rounded, whether the result is
+    affected must still be checked with ``keeps_resize_size``.)
+
+    """
+    processor, transposed = _get_first_resize(processors)
+    if processor is None:
+        return 1
+
+    target = get_resize_size(processor, size)
+    if not target or not all(target):
+        return 1
+    factor = _get_factor(size, target)
+
+    if transposed:
+        # We don't know if the image will be rotated, so we make sure that
+        # both orientations are still big enough.
+        rotated = size[1], size[0]
+        target = get_resize_size(processor, rotated)
+        if not target or not all(target):
+            return 1
+        factor = min(factor, _get_factor(rotated, target))
+
+    return max(factor, 1)
+
+
+def get_reduced_size(size, factor):
+    """
+    Returns the size of an image of the provided size once it's been reduced
+    (or drafted) by ``factor``. Partial pixels are kept, so it's rounded up.
+
+    """
+    return tuple(-(-dimension // factor) for dimension in size)
+
+
+def keeps_resize_size(processors, size, reduced_size):
+    """
+    Returns whether the first resize of ``processors`` scales an image of
+    ``reduced_size`` to the same size as one of ``size``, so that the result
+    of the processors is the same size (in either orientation, if they may
+    transpose it).
+
+    """
+    processor, transposed = _get_first_resize(processors)
+    if processor is None:
+        return False
+    sizes = [(size, reduced_size)]
+    if transposed:
+        sizes.append((size[::-1], reduced_size[::-1]))
+    for original, reduced in sizes:
+        target = get_resize_size(processor, original)
+        if not target or target != get_resize_size(processor, reduced):
+            return False
+    return True
+
+
+def _get_shrink_factor(processor_lists, size, factors):
+    for factor in factors:
+        reduced_size = get_reduced_size(size, factor)
+        if all(keeps_resize_size(processors, size, reduced_size)
+               for processors in processor_lists):
+            return factor
+    return 1
+
+
+def shrink_on_load(img, *processor_lists):
+    """
+    Shrinks a freshly opened (not yet loaded) image as much as the provided
+    lists of processors allow without changing the size of their results.
+    JPEGs are configured to be decoded at a reduced scale; other images are
+    decoded and then reduced with a fast box filter.
+
+    """
+    processor_lists = [processors or [] for processors in processor_lists]
+    factor = min([get_reduction_factor(processors, img.size)
+                  for processors in processor_lists] or [1])
+    if factor < 2:
+        return img
+
+    width, height = img.size
+    if img.format == 'JPEG':
+        # JPEGs can only be drafted at scales of 1/2, 1/4 and 1/8.
+        scale = _get_shrink_factor(
+            processor_lists, img.size,
+            [s for s in (8, 4, 2) if s <= factor])
+        if scale > 1:
+            img.draft(img.mode, (width // scale, height // scale))
+        return img
+
+    # The reduced image is a plain ``Image``, which lacks the EXIF data
+    # ``Transpose`` relies on, so we leave those alone.
+    if (img.mode in REDUCIBLE_MODES
+            and getattr(img, 'n_frames', 1) == 1
+            and not any(isinstance(p, Transpose)
+                        for processors in processor_lists
+                        for p in processors)):
+        factor = _get_shrink_factor(processor_lists, img.size,
+                                    range(factor, 1, -1))
+        if factor > 1:
+            format = img.format
+            img = img.reduce(factor)
+            img.format = format
+    return img
+
+
+def copy_image(img):
+    """
+    Copies a decoded image, keeping the attributes of the original (its format
+    and EXIF data) that processors and ``process_image`` rely on.
+
+    """
+    new_img = img.copy()
+    new_img.format = img.format
+    if hasattr(img, '_getexif'):
+        new_img._getexif = img._getexif
+    return new_img
+
+
+class _Identity:
+    """
+    Wraps an object so that it's only equal to itself, keeping it alive (so
+    that its id can't be reused) for as long as the wrapper is.
+
+    """
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __eq__(self, other):
+        return isinstance(other, _Identity) and other.obj is self.obj
+
+    def __hash__(self):
+        return id(self.obj)
+
+
+def _get_processor_key(processor):
+    # Processors are only considered the same if their complete state is (a
+    # hash could collide, and the canonical one leaves out private
+    # attributes), or if they're the very same object.
+    try:
+        return hashers.dumps(processor)
+    except Exception:
+        return _Identity(processor)
+
+
+def get_prefix_keys(processors):
+    """
+    Returns keys identifying every (non-empty) leading slice of
+    ``processors``, shortest first. The keys of two slices are only equal if
+    their processors are sure to produce the same image.
+
+    """
+    keys = [_get_processor_key(p) for p in processors or []]
+    return [tuple(keys[:i]) for i in range(1, len(keys) + 1)]
+
+
+def find_shared_prefixes(processor_lists):
+    """
+    Returns the keys of the leading slices that at least two of the provided
+    processor lists have in common.
+
+    """
+    counts = {}
+    for processors in processor_lists:
+        for prefix_key in get_prefix_keys(processors):
+            counts[prefix_key] = counts.get(prefix_key, 0) + 1
+    return {key for key, count in counts.items() if count > 1}
+
+
+intermediate_cache = LRUCache(settings.IMAGEKIT_INTERMEDIATE_CACHE_SIZE)
+"""
+Images produced by processor prefixes that are shared by several specs, keyed
+by source name and prefix key.
+
+"""
+
+
+class SharedSource:
+    """
+    A source file that is decoded at most once, no matter how many specs ask
+    for it. Each spec gets its own copy of the decoded image, so processors are
+    free to modify it. If several of the specs start with the same processors,
+    the result of those is computed once too.
+
+    """
+    def __init__(self, source, processor_lists):
+        self.source = source
+        self.processor_lists = processor_lists
+        self._image = None
+        self._shared_prefixes = None
+        self._cache_keys = set()
+
+    @property
+    def shared_prefixes(self):
+        if self._shared_prefixes is None:
+            if settings.IMAGEKIT_INTERMEDIATE_CACHE_SIZE:
+                self._shared_prefixes = find_shared_prefixes(
+                        self.processor_lists)
+            else:
+                self._shared_prefixes = set()
+        return self._shared_prefixes
+
+    def open_image(self, processors=None):
+        """
+        Returns a tuple containing a copy of the decoded source (or of the
+        result of the longest shared prefix of ``processors``) and the
+        processors that remain to be run on it. The image is ``None`` if the
+        source was shrunk on load more than ``processors`` allow.
+
+        """
+        processors = list(processors or [])
+
+        if self._image is None:
+            img = open_image(self.source)
+            self.original_size = img.size
+            if settings.IMAGEKIT_SHRINK_ON_LOAD:
+                img = shrink_on_load(img, *self.processor_lists)
+            img.load()
+            self._image = img
+
+        factor = self.original_size[0] // self._image.size[0]
+        if factor > 1 and get_reduction_factor(processors,
+                                               self.original_size) < factor:
+            return None, processors
+
+        if self.shared_prefixes:
+            prefix_keys = get_prefix_keys(processors)
+            for i in range(len(prefix_keys), 0, -1):
+                if prefix_keys[i - 1] in self.shared_prefixes:
+                    img = self._get_intermediate(processors[:i],
+                                                 prefix_keys[i - 1])
+                    return copy_image(img), processors[i:]
+
+        return copy_image(self._image), processors
+
+    def _get_intermediate(self, processors, prefix_key):
+        key = (getattr(self.source, 'name', None) or id(self.source),
+               prefix_key)
+        img = intermediate_cache.get(key)
+        if img is None:
+            img = ProcessorPipeline(processors).process(
+                    copy_image(self._image))
+            # Keep the original format so that ``process_image`` can still
+            # fall back to it.
+            img.format = self._image.format
+            intermediate_cache.set(key, img)
+            self._cache_keys.add(key)
+        return img
+
+    def close(self):
+        self._image = None
+        # The source may change after this, so intermediates can't be reused.
+        for key in self._cache_keys:
+            intermediate_cache.pop(key)
+        self._cache_keys.clear()
+
+
+_local = threading.local()
+
+
+@contextmanager
+def share_source(source, generators):
+    """
+    A context manager within which specs using ``source`` decode it only once.
+    The processors of the specs in ``generators`` determine how much the source
+    may be shrunk on load, and the source is only decoded if one of them
+    actually generates an image.
+
+    """
+    shared = SharedSource(source, [getattr(generator, 'processors', None)
+                                   for generator in generators])
+    stack = _local.__dict__.setdefault('shared_sources', [])
+    stack.append(shared)
+    try:
+        yield shared
+    finally:
+        stack.remove(shared)
+        shared.close()
+
+
+def get_shared_source(source):
+    """
+    Returns the ``SharedSource`` for the source object, if it's currently being
+    shared (see ``share_source``).
+
+    """
+    for shared in reversed(getattr(_local, 'shared_sources', [])):
+        if shared.source is source:
+            return shared
+    return None
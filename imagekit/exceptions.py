@@ -17,6 +17,18 @@ class MissingSource(ValueError):
     pass
 
 
+class GenerationFailed(Exception):
+    """
+    Raised instead of generating a file whose previous generation failed, until
+    it's time to retry. The ``failure`` attribute holds the details of the
+    failure recorded by the cache file backend.
+
+    """
+    def __init__(self, message, failure=None):
+        super().__init__(message)
+        self.failure = failure
+
+
 # Aliases for backwards compatibility
 UnknownExtensionError = UnknownExtension
 UnknownFormatError = UnknownFormat
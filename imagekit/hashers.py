@@ -1,5 +1,23 @@
+"""
+Functions for hashing the attributes of image generators. The resulting hashes
+are used to name cache files, so they must only change when the output of the
+generator would.
+
+``pickle`` is the original hasher. Because it serializes every attribute of
+every processor, its output changes whenever the internals of a processor do
+(for example, when upgrading pilkit). ``canonical`` only considers the
+parameters that processors are constructed with (when those make up all of
+their state) and is considerably faster.
+Which one is used to name spec cache files is controlled by the
+``IMAGEKIT_SPEC_HASHER`` setting.
+
+"""
+
+import enum
+import inspect
+import json
 from copy import copy
-from hashlib import md5
+from hashlib import blake2b, md5
 from io import BytesIO
 from pickle import DICT, MARK, _Pickler
 
@@ -24,7 +42,248 @@ class CanonicalizingPickler(_Pickler):
     dispatch[dict] = save_dict
 
 
-def pickle(obj):
+def dumps(obj):
     file = BytesIO()
     CanonicalizingPickler(file, 0).dump(obj)
-    return md5(file.getvalue()).hexdigest()
+    return file.getvalue()
+
+
+def pickle(obj):
+    return md5(dumps(obj)).hexdigest()
+
+
+def _get_type_name(cls):
+    # Classes can declare a name of their own (``hash_name``) so that moving
+    # them to another module doesn't change the hash. It isn't inherited, since
+    # subclasses are different types.
+    name = cls.__dict__.get('hash_name')
+    if isinstance(name, str):
+        return name
+    return '%s.%s' % (cls.__module__, cls.__qualname__)
+
+
+_params = {}
+
+
+def _get_params(cls):
+    """
+    Returns the names and defaults of the parameters declared by a class's
+    constructor, or ``None`` if they can't be used to describe its instances.
+
+    """
+    try:
+        return _params[cls]
+    except KeyError:
+        pass
+    try:
+        signature = inspect.signature(cls.__init__)
+    except (TypeError, ValueError):
+        params = None
+    else:
+        params = []
+        for param in list(signature.parameters.values())[1:]:
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                # There's no telling how these are stored.
+                params = None
+                break
+            params.append((param.name, param.default))
+    _params[cls] = params
+    return params
+
+
+_layouts = {}
+
+
+def _get_layout(cls):
+    """
+    Returns the names of the slots of a class, or ``None`` if its instances'
+    state can't be found in their attributes: either they have none (like
+    many built-in types) or they customize how they're pickled (like
+    ``PIL.Image.Image``), which suggests their state is kept elsewhere.
+
+    """
+    try:
+        return _layouts[cls]
+    except KeyError:
+        pass
+    layout = []
+    has_dict = False
+    for klass in cls.__mro__:
+        if klass is object:
+            continue
+        slots = klass.__dict__.get('__slots__')
+        if slots is None:
+            # Classes without ``__slots__`` give their instances a
+            # ``__dict__``, unless they're built-in.
+            has_dict = has_dict or '__dict__' in klass.__dict__
+            continue
+        for name in [slots] if isinstance(slots, str) else slots:
+            if name == '__dict__':
+                has_dict = True
+            elif name != '__weakref__':
+                if name.startswith('__') and not name.endswith('__'):
+                    name = '_%s%s' % (klass.__name__.lstrip('_'), name)
+                layout.append(name)
+    if (not has_dict and not layout) or any(
+            getattr(cls, name, None) is not getattr(object, name, None)
+            for name in ('__reduce_ex__', '__reduce__', '__getstate__')):
+        layout = None
+    _layouts[cls] = layout
+    return layout
+
+
+def _get_state(obj):
+    """
+    Returns the attributes of an object (including those stored in slots), or
+    ``None`` if they don't describe it.
+
+    """
+    layout = _get_layout(obj.__class__)
+    if layout is None:
+        return None
+    state = dict(getattr(obj, '__dict__', {}))
+    for name in layout:
+        try:
+            state[name] = getattr(obj, name)
+        except AttributeError:
+            pass
+    return state
+
+
+def canonicalize(obj):
+    """
+    Converts an object into a JSON-serializable structure that only depends on
+    its value. Objects are described by their type and the parameters declared
+    by their constructor, as long as their attributes are exactly those
+    parameters; parameters with their default values are left out so that
+    adding new, optional parameters doesn't change the result. Other objects
+    are described by all of their attributes or, if they customize how they're
+    pickled, by their pickled form. Objects that can't be described faithfully
+    raise ``TypeError``.
+
+    """
+    if isinstance(obj, enum.Enum):
+        return canonicalize(obj.value)
+    elif obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    elif isinstance(obj, bytes):
+        return {'__bytes__': obj.hex()}
+    elif isinstance(obj, (list, tuple)):
+        return [canonicalize(item) for item in obj]
+    elif isinstance(obj, (set, frozenset)):
+        return {'__set__': sorted((canonicalize(item) for item in obj),
+                                  key=_dumps_canonical)}
+    elif isinstance(obj, dict):
+        items = [[canonicalize(k), canonicalize(v)] for k, v in obj.items()]
+        return {'__dict__': sorted(items, key=_dumps_canonical)}
+    elif inspect.isclass(obj) or inspect.isroutine(obj):
+        return {'__type__': _get_type_name(obj)}
+
+    cls = obj.__class__
+    state = _get_state(obj)
+    if state is None:
+        try:
+            data = dumps(obj)
+        except Exception as e:
+            raise TypeError('%r can\'t be hashed canonically: %s'
+                            % (obj, e)) from e
+        return {'__class__': _get_type_name(cls),
+                'pickle': _canonical_digest(data).hexdigest()}
+
+    params = _get_params(cls)
+    if params is not None and set(state) == {name for name, _ in params}:
+        values = {name: state[name] for name, default in params
+                  if state[name] is not default and state[name] != default}
+        return {'__class__': _get_type_name(cls),
+                'params': {k: canonicalize(v) for k, v in values.items()}}
+    return {'__class__': _get_type_name(cls),
+            'state': {k: canonicalize(v) for k, v in state.items()}}
+
+
+def _dumps_canonical(obj):
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'),
+                      ensure_ascii=False)
+
+
+def canonical_dumps(obj):
+    return _dumps_canonical(canonicalize(obj)).encode('utf-8')
+
+
+def _canonical_digest(data=b''):
+    return blake2b(data, digest_size=16)
+
+
+def canonical(obj):
+    return _canonical_digest(canonical_dumps(obj)).hexdigest()
+
+
+class HashTemplate:
+    """
+    Hashes a list in which a single string varies between calls, serializing
+    the rest of the list only once. ``template.hash(value)`` is equivalent to
+    hashing the list with ``value`` at ``index``.
+
+    """
+    placeholder = '\x00imagekit:placeholder\x00'
+
+    def __init__(self, items, index=0):
+        items = list(items)
+        items[index] = self.placeholder
+        data = self.dumps(items)
+        self.head, self.tail = data.split(self.dumps_str(self.placeholder), 1)
+
+    def dumps(self, obj):
+        raise NotImplementedError
+
+    def dumps_str(self, value):
+        raise NotImplementedError
+
+    def new_digest(self, data):
+        raise NotImplementedError
+
+    def hash(self, value):
+        if not isinstance(value, str):
+            raise TypeError('Only strings can be substituted into a hash'
+                            ' template.')
+        digest = self.new_digest(self.head)
+        digest.update(self.dumps_str(value))
+        digest.update(self.tail)
+        return digest.hexdigest()
+
+
+class PickleTemplate(HashTemplate):
+    """
+    A ``HashTemplate`` producing the same hashes as ``pickle``.
+
+    """
+    def dumps(self, obj):
+        return dumps(obj)
+
+    def dumps_str(self, value):
+        # The protocol 0 opcode for a string is everything up to (and
+        # including) the first newline; what follows is the memo entry and
+        # STOP.
+        data = dumps(value)
+        return data[:data.index(b'\n') + 1]
+
+    def new_digest(self, data):
+        return md5(data)
+
+
+class CanonicalTemplate(HashTemplate):
+    """
+    A ``HashTemplate`` producing the same hashes as ``canonical``.
+
+    """
+    def dumps(self, obj):
+        return canonical_dumps(obj)
+
+    def dumps_str(self, value):
+        return _dumps_canonical(value).encode('utf-8')
+
+    def new_digest(self, data):
+        return _canonical_digest(data)
+
+
+pickle.template = PickleTemplate
+canonical.template = CanonicalTemplate
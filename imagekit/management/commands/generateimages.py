@@ -1,9 +1,69 @@
+import json
+import multiprocessing
+import os
 import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, time
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
+from ...cachefiles import seed_cachefile_states
+from ...cachefiles.backends import (
+    CacheFileState, get_generation_payload, load_from_payload)
 from ...exceptions import MissingSource
 from ...registry import cachefile_registry, generator_registry
+from ...specs.sourcegroups import get_source_position
+from ...utils import chunked
+
+
+def generate_file(image_file):
+    """
+    Generates a cache file, returning a message describing the failure, if
+    any.
+
+    """
+    try:
+        image_file.generate()
+    except MissingSource as err:
+        return '\t No source associated with\n'
+    except Exception as err:
+        return '\tFailed %s\n' % (err)
+    return None
+
+
+def _generate_files(files):
+    from django.db import connection
+    try:
+        return [generate_file(image_file) for image_file in files]
+    finally:
+        # Django won't clean up connections opened outside of requests.
+        connection.close()
+
+
+def _load_payload(payload, image_file, missing):
+    if payload is not None:
+        image_file = load_from_payload(payload)
+    if missing:
+        # Keep what the storage listing said (see ``seed_cachefile_states``).
+        image_file._cachefile_state = CacheFileState.DOES_NOT_EXIST
+    return image_file
+
+
+def _generate_payloads(items):
+    from django.db import connections
+    try:
+        return [generate_file(_load_payload(*item)) for item in items]
+    finally:
+        connections.close_all()
+
+
+def _init_process_worker():
+    import django
+    django.setup()
 
 
 class Command(BaseCommand):
@@ -15,9 +75,40 @@ segments. (Segments are separated with colons.) So, for example,
 match both. Subsegments are always matched, so "a" will match "a" as
 well as "a:b" and "a:b:c".""")
     args = '[generator_ids]'
+    chunk_size = 1000
 
     def add_arguments(self, parser):
         parser.add_argument('generator_id', nargs='*', help='<app_name>:<model>:<field> for model specs')
+        parser.add_argument(
+            '--list-storage', action='store_true',
+            help='List the cache file directory of each storage once, instead'
+                 ' of checking whether each file exists separately.')
+        parser.add_argument(
+            '--jobs', '-j', type=int, default=1,
+            help='The number of workers generating files at the same time.')
+        parser.add_argument(
+            '--executor', choices=['thread', 'process'], default='thread',
+            help='Whether the workers are threads or processes (when --jobs is'
+                 ' greater than one).')
+        parser.add_argument(
+            '--chunk-size', type=int, default=self.chunk_size,
+            help='The number of files handed to a worker at a time.')
+        parser.add_argument(
+            '--checkpoint', metavar='PATH',
+            help='A file in which to record the progress of each generator, so'
+                 ' that an interrupted run can be resumed.')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Skip the source instances that were already processed'
+                 ' according to the --checkpoint file.')
+        parser.add_argument(
+            '--since', metavar='PK_OR_TIMESTAMP',
+            help='Only process the source instances with a greater primary'
+                 ' key, or that were added or changed since the time.')
+        parser.add_argument(
+            '--shard', metavar='I/N',
+            help='Only process the I-th of N disjoint parts of the files (from'
+                 ' 1/N to N/N), so that they can be split between machines.')
 
     def handle(self, *args, **options):
         generators = generator_registry.get_ids()
@@ -27,17 +118,212 @@ well as "a:b" and "a:b:c".""")
             patterns = self.compile_patterns(generator_ids)
             generators = (id for id in generators if any(p.match(id) for p in patterns))
 
+        jobs = options.get('jobs') or 1
+        chunk_size = options.get('chunk_size') or self.chunk_size
+        if jobs < 1 or chunk_size < 1:
+            raise CommandError('--jobs and --chunk-size must be positive.')
+        self.checkpoint = options.get('checkpoint')
+        self.positions = {}
+        # The models whose positions can't advance because a file failed.
+        self.stalled = {}
+        if options.get('resume'):
+            if not self.checkpoint:
+                raise CommandError('--resume requires --checkpoint.')
+            self.positions = self.load_checkpoint(self.checkpoint)
+        since = self.parse_since(options.get('since'))
+        shard = self.parse_shard(options.get('shard'))
+
+        listings = {} if options.get('list_storage') else None
+        chunks = self.get_chunks(generators, chunk_size, listings, since,
+                                 shard)
+
+        if jobs == 1:
+            self.generate_serially(chunks)
+        else:
+            executor = options.get('executor') or 'thread'
+            self.generate_in_parallel(chunks, jobs, executor)
+
+    def get_chunks(self, generators, chunk_size, listings=None, since=None,
+                   shard=None):
+        """
+        Yields ``(generator_id, files)`` tuples, where ``files`` is a chunk of
+        the cache files of the generator. Generators without files yield a
+        single, empty chunk.
+
+        """
         for generator_id in generators:
+            kwargs = {}
+            if self.positions.get(generator_id):
+                kwargs['after'] = dict(self.positions[generator_id])
+            if since is not None:
+                kwargs['since'] = since
+            if shard is not None:
+                kwargs['shard'] = shard
+            files = (image_file for image_file
+                     in cachefile_registry.get(generator_id, **kwargs)
+                     if image_file.name)
+            empty = True
+            for chunk in chunked(files, chunk_size):
+                empty = False
+                if listings is not None:
+                    seed_cachefile_states(chunk, listings)
+                yield generator_id, chunk
+            if empty:
+                yield generator_id, []
+
+    def generate_serially(self, chunks):
+        current_id = None
+        for generator_id, files in chunks:
+            if generator_id != current_id:
+                self.stdout.write('Validating generator: %s\n' % generator_id)
+                current_id = generator_id
+            messages = []
+            for image_file in files:
+                self.stdout.write('  %s\n' % image_file.name)
+                messages.append(generate_file(image_file))
+                self.report(messages[-1])
+            self.record_progress(generator_id, files, messages)
+
+    def generate_in_parallel(self, chunks, jobs, executor):
+        """
+        Generates the chunks of files in a pool of workers. To keep memory
+        usage bounded, only a few chunks are read ahead of the workers; results
+        are reported in the order the files were read, as they would be when
+        generating them serially.
+
+        """
+        if executor == 'process':
+            pool = ProcessPoolExecutor(
+                max_workers=jobs,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_process_worker)
+        else:
+            pool = ThreadPoolExecutor(max_workers=jobs)
+
+        pending = deque()
+        current_id = None
+        with pool:
+            for generator_id, files in chunks:
+                pending.append((generator_id, files,
+                                self.submit(pool, executor, files)))
+                while len(pending) > jobs * 2:
+                    current_id = self.report_chunk(pending.popleft(),
+                                                   current_id)
+            while pending:
+                current_id = self.report_chunk(pending.popleft(), current_id)
+
+    def submit(self, pool, executor, files):
+        if not files:
+            return None
+        if executor == 'process':
+            # Workers are sent a compact description of each file when
+            # possible (see ``get_generation_payload``).
+            items = []
+            for image_file in files:
+                payload = get_generation_payload(image_file)
+                missing = (getattr(image_file, '_cachefile_state', None)
+                           == CacheFileState.DOES_NOT_EXIST)
+                items.append((payload,
+                              image_file if payload is None else None,
+                              missing))
+            return pool.submit(_generate_payloads, items)
+        return pool.submit(_generate_files, files)
+
+    def report_chunk(self, item, current_id):
+        generator_id, files, future = item
+        if generator_id != current_id:
             self.stdout.write('Validating generator: %s\n' % generator_id)
-            for image_file in cachefile_registry.get(generator_id):
-                if image_file.name:
-                    self.stdout.write('  %s\n' % image_file.name)
-                    try:
-                        image_file.generate()
-                    except MissingSource as err:
-                        self.stdout.write('\t No source associated with\n')
-                    except Exception as err:
-                        self.stdout.write('\tFailed %s\n' % (err))
+        messages = []
+        if future is not None:
+            try:
+                messages = future.result()
+            except Exception as err:
+                messages = ['\tFailed %s\n' % (err)] * len(files)
+            for image_file, message in zip(files, messages):
+                self.stdout.write('  %s\n' % image_file.name)
+                self.report(message)
+        self.record_progress(generator_id, files, messages)
+        return generator_id
+
+    def record_progress(self, generator_id, files, messages):
+        """
+        Records the position of the last source instance of each model that
+        was processed, and saves the checkpoint file. ``messages`` are the
+        results of generating the files (see ``generate_file``). Positions
+        don't advance past a file that failed for the rest of the run, so that
+        a resumed run retries it (files after it that were generated are then
+        skipped, since they exist).
+
+        """
+        if not self.checkpoint or not files:
+            return
+        positions = self.positions.setdefault(generator_id, {})
+        stalled = self.stalled.setdefault(generator_id, set())
+        for image_file, message in zip(files, messages):
+            source = getattr(image_file.generator, 'source', None)
+            position = get_source_position(source)
+            if position is None:
+                continue
+            label, pk = position
+            if message is not None:
+                stalled.add(label)
+            elif label not in stalled:
+                positions[label] = pk
+        self.save_checkpoint(self.checkpoint, self.positions)
+
+    def load_checkpoint(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f).get('generators', {})
+        except FileNotFoundError:
+            return {}
+        except ValueError as err:
+            raise CommandError('Invalid checkpoint file %s: %s' % (path, err))
+
+    def save_checkpoint(self, path, positions):
+        # Write to a temporary file first, so that an interruption can't leave
+        # a truncated checkpoint behind.
+        tmp_path = '%s.tmp' % path
+        with open(tmp_path, 'w') as f:
+            json.dump({'generators': positions}, f, default=str)
+        os.replace(tmp_path, path)
+
+    def parse_since(self, value):
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            pass
+        try:
+            since = parse_datetime(value)
+            date = parse_date(value) if since is None else None
+        except ValueError:
+            since = date = None
+        if since is None:
+            if date is None:
+                raise CommandError('--since must be a primary key, a date or a'
+                                   ' datetime, not %r.' % value)
+            since = datetime.combine(date, time())
+        if settings.USE_TZ and timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
+    def parse_shard(self, value):
+        if value is None:
+            return None
+        try:
+            index, count = (int(part) for part in value.split('/'))
+        except ValueError:
+            index = count = 0
+        if not 1 <= index <= count:
+            raise CommandError('--shard must be I/N, with 1 <= I <= N, not %r.'
+                               % value)
+        return index - 1, count
+
+    def report(self, message):
+        if message:
+            self.stdout.write(message)
 
     def compile_patterns(self, generator_ids):
         return [self.compile_pattern(id) for id in generator_ids]
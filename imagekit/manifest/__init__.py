@@ -0,0 +1,6 @@
+"""
+An optional app providing the database table used by the
+``imagekit.cachefiles.backends.Manifest`` cache file backend. Add
+``'imagekit.manifest'`` to your ``INSTALLED_APPS`` to use it.
+
+"""
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class ManifestConfig(AppConfig):
+    name = 'imagekit.manifest'
+    label = 'imagekit_manifest'
+    verbose_name = 'ImageKit manifest'
+    default_auto_field = 'django.db.models.AutoField'
@@ -0,0 +1,40 @@
+from django.db import models
+from django.utils import timezone
+
+
+class ManifestEntry(models.Model):
+    """
+    A record of a generated cache file.
+
+    """
+    name = models.CharField(max_length=255, unique=True)
+    generator_id = models.CharField(max_length=255, blank=True)
+    source_name = models.CharField(max_length=255, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    size = models.BigIntegerField(null=True, blank=True)
+    format = models.CharField(max_length=20, blank=True)
+    mimetype = models.CharField(max_length=100, blank=True)
+    generated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = 'manifest entries'
+
+    def __str__(self):
+        return self.name
+
+    def get_metadata(self):
+        """
+        Returns the metadata of the file in the form recorded by cache file
+        backends, or ``None`` if its dimensions weren't recorded.
+
+        """
+        if self.width is None or self.height is None:
+            return None
+        return {
+            'width': self.width,
+            'height': self.height,
+            'size': self.size,
+            'format': self.format or None,
+            'mimetype': self.mimetype or None,
+        }
@@ -2,3 +2,4 @@
 
 from .. import conf
 from .fields import ImageSpecField, ProcessedImageField
+from .query import ImageKitQuerySet, ImageKitQuerySetMixin, prefetch_imagekit
@@ -12,10 +12,20 @@ class ImageSpecFileDescriptor:
             return self.field
         else:
             source = getattr(instance, self.source_field_name)
-            spec = self.field.get_spec(source=source)
-            file = ImageCacheFile(spec)
-            instance.__dict__[self.attname] = file
+            file = instance.__dict__.get(self.attname)
+            if not self._is_current(file, source):
+                spec = self.field.get_spec(source=source)
+                file = ImageCacheFile(spec)
+                file._source_name = getattr(source, 'name', None)
+                instance.__dict__[self.attname] = file
             return file
 
+    def _is_current(self, file, source):
+        # The file we created last time (and any state it has loaded) can be
+        # reused as long as the source hasn't changed since.
+        return (isinstance(file, ImageCacheFile)
+                and getattr(file.generator, 'source', None) is source
+                and getattr(file, '_source_name', None) == getattr(source, 'name', None))
+
     def __set__(self, instance, value):
         instance.__dict__[self.attname] = value
@@ -0,0 +1,88 @@
+from django.db import models
+
+from ..cachefiles import prime_cachefiles
+from ..cachefiles.backends import CacheFileState
+from ..utils import call_strategy_method
+
+
+def prefetch_imagekit(instances, *field_names, generate=True):
+    """
+    Prepares the cache files of the named ``ImageSpecField``\\s for many model
+    instances at once. The cache files are created up front and stored on the
+    instances, and their states are loaded in bulk (see ``prime_cachefiles``),
+    so that accessing them later doesn't require a cache lookup per file. If
+    ``generate`` is true, the cache file strategy of each file that doesn't
+    exist yet and has an asynchronous cache file backend is given the chance
+    to schedule its generation right away. (Files with synchronous backends
+    are left to be generated when they're accessed, as usual, rather than
+    one after the other while the instances are being fetched.)
+
+    Returns the instances as a list::
+
+        photos = prefetch_imagekit(Photo.objects.all(), 'thumbnail', 'avatar')
+
+    """
+    instances = list(instances)
+    files = []
+    for instance in instances:
+        for field_name in field_names:
+            file = getattr(instance, field_name, None)
+            if file is not None and file.name:
+                files.append(file)
+
+    prime_cachefiles(files)
+
+    if generate:
+        for file in files:
+            if (getattr(file.cachefile_backend, 'is_async', False)
+                    and getattr(file, '_cachefile_state', None)
+                    != CacheFileState.EXISTS):
+                call_strategy_method(file, 'on_existence_required')
+    return instances
+
+
+class ImageKitQuerySetMixin:
+    """
+    A mixin for querysets that adds a ``prefetch_imagekit()`` method. Like
+    ``prefetch_related()``, it's lazy: the cache files of the named
+    ``ImageSpecField``\\s are prepared (see ``prefetch_imagekit``) when the
+    queryset is evaluated::
+
+        class PhotoQuerySet(ImageKitQuerySetMixin, models.QuerySet):
+            pass
+
+        class Photo(models.Model):
+            ...
+            objects = PhotoQuerySet.as_manager()
+
+        for photo in Photo.objects.prefetch_imagekit('thumbnail'):
+            ...
+
+    """
+    _imagekit_fields = ()
+
+    def prefetch_imagekit(self, *field_names):
+        clone = self._chain()
+        if field_names == (None,):
+            clone._imagekit_fields = ()
+        else:
+            clone._imagekit_fields = self._imagekit_fields + field_names
+        return clone
+
+    def _clone(self, *args, **kwargs):
+        clone = super()._clone(*args, **kwargs)
+        clone._imagekit_fields = self._imagekit_fields
+        return clone
+
+    def _fetch_all(self):
+        fetched = self._result_cache is None
+        super()._fetch_all()
+        if fetched and self._imagekit_fields:
+            prefetch_imagekit(
+                [obj for obj in self._result_cache
+                 if isinstance(obj, models.Model)],
+                *self._imagekit_fields)
+
+
+class ImageKitQuerySet(ImageKitQuerySetMixin, models.QuerySet):
+    pass
@@ -1,6 +1,9 @@
+from collections import Counter
+
+from .decoding import share_source
 from .exceptions import AlreadyRegistered, NotRegistered
 from .signals import content_required, existence_required, source_saved
-from .utils import autodiscover, call_strategy_method
+from .utils import autodiscover, call_strategy_method, get_shard
 
 
 class GeneratorRegistry:
@@ -12,22 +15,49 @@ class GeneratorRegistry:
     """
     def __init__(self):
         self._generators = {}
-        content_required.connect(self.content_required_receiver)
-        existence_required.connect(self.existence_required_receiver)
+        # The number of ids each generator is registered with, so that
+        # signals can be checked against them without scanning the registry.
+        self._registered = Counter()
+        content_required.connect_direct(
+            self.content_required_receiver,
+            dispatch_uid='ik_content_required_%s' % id(self))
+        existence_required.connect_direct(
+            self.existence_required_receiver,
+            dispatch_uid='ik_existence_required_%s' % id(self))
 
     def register(self, id, generator):
         registered_generator = self._generators.get(id)
         if registered_generator and generator != self._generators[id]:
             raise AlreadyRegistered('The generator with id %s is'
                                     ' already registered' % id)
+        if registered_generator is not None:
+            self._unindex(registered_generator)
         self._generators[id] = generator
+        self._index(generator)
 
     def unregister(self, id):
         try:
-            del self._generators[id]
+            generator = self._generators.pop(id)
         except KeyError:
             raise NotRegistered('The generator with id %s is not'
                                 ' registered' % id)
+        self._unindex(generator)
+
+    def _index(self, generator):
+        try:
+            self._registered[generator] += 1
+        except TypeError:
+            # Unhashable generator instances can't be the class of a file's
+            # generator anyway.
+            pass
+
+    def _unindex(self, generator):
+        try:
+            self._registered[generator] -= 1
+            if self._registered[generator] <= 0:
+                del self._registered[generator]
+        except TypeError:
+            pass
 
     def get(self, id, **kwargs):
         autodiscover()
@@ -38,7 +68,15 @@ class GeneratorRegistry:
             raise NotRegistered('The generator with id %s is not'
                                 ' registered' % id)
         if callable(generator):
-            return generator(**kwargs)
+            generator = generator(**kwargs)
+            try:
+                # Remember how the generator was created so that it can be
+                # recreated elsewhere (see ``imagekit.cachefiles.backends``).
+                generator._registry_args = (id, {
+                    k: v for k, v in kwargs.items() if k != 'source'})
+            except AttributeError:
+                pass
+            return generator
         else:
             return generator
 
@@ -52,12 +90,20 @@ class GeneratorRegistry:
     def existence_required_receiver(self, sender, file, **kwargs):
         self._receive(file, 'on_existence_required')
 
-    def _receive(self, file, callback):
-        generator = file.generator
+    def is_registered(self, generator):
+        """
+        Returns whether the generator is an instance of a registered generator
+        class, or was created by the registry from a registered callable.
+
+        """
+        if generator.__class__ in self._registered:
+            return True
+        registry_args = getattr(generator, '_registry_args', None)
+        return registry_args is not None and registry_args[0] in self._generators
 
-        # FIXME: I guess this means you can't register functions?
-        if generator.__class__ in self._generators.values():
-            # Only invoke the strategy method for registered generators.
+    def _receive(self, file, callback):
+        # Only invoke the strategy method for registered generators.
+        if self.is_registered(file.generator):
             call_strategy_method(file, callback)
 
 
@@ -111,9 +157,12 @@ class SourceGroupRegistry:
                 self._source_groups[source_group]]
         callback_name = self._signals[signal]
 
-        for spec in specs:
-            file = ImageCacheFile(spec)
-            call_strategy_method(file, callback_name)
+        # Every spec is working from the same source, so we only want to
+        # decode it once.
+        with share_source(source, specs):
+            for spec in specs:
+                file = ImageCacheFile(spec)
+                call_strategy_method(file, callback_name)
 
 
 class CacheFileRegistry:
@@ -129,6 +178,9 @@ class CacheFileRegistry:
 
     def __init__(self):
         self._cachefiles = {}
+        # The reverse mapping, from generator ids to (a dict used as an
+        # ordered set of) the cachefiles registered with them.
+        self._generator_cachefiles = {}
 
     def register(self, generator_id, cachefiles):
         """
@@ -138,6 +190,7 @@ class CacheFileRegistry:
         if cachefiles not in self._cachefiles:
             self._cachefiles[cachefiles] = set()
         self._cachefiles[cachefiles].add(generator_id)
+        self._generator_cachefiles.setdefault(generator_id, {})[cachefiles] = None
 
     def unregister(self, generator_id, cachefiles):
         """
@@ -146,12 +199,31 @@ class CacheFileRegistry:
         """
         try:
             self._cachefiles[cachefiles].remove(generator_id)
+            del self._generator_cachefiles[generator_id][cachefiles]
         except KeyError:
             pass
 
-    def get(self, generator_id):
-        for k, v in self._cachefiles.items():
-            if generator_id in v:
+    def get(self, generator_id, **kwargs):
+        """
+        Yields the files associated with the generator id. Keyword arguments
+        (like the ``after``, ``since`` and ``shard`` arguments of
+        ``ImageFieldSourceGroup.files()``) are passed on to the registered
+        file sources that are ``resumable``; the others yield all of their
+        files, or, if a ``shard`` is given, the ones whose names belong to it.
+
+        """
+        shard = kwargs.get('shard')
+        # Copy the cachefiles, since registering more while iterating over
+        # their files would otherwise break the iteration.
+        for k in list(self._generator_cachefiles.get(generator_id, ())):
+            if kwargs and getattr(k, 'resumable', False):
+                yield from k(**kwargs)
+            elif shard is not None:
+                index, count = shard
+                for file in k():
+                    if file.name and get_shard(file.name, count) == index:
+                        yield file
+            else:
                 yield from k()
 
 
@@ -1,8 +1,51 @@
 from django.dispatch import Signal
 
+
+class DirectSignal(Signal):
+    """
+    A signal that calls its direct receiver (see ``connect_direct()``) without
+    going through Django's dispatching machinery as long as no other receivers
+    are connected. The generated file signals are sent every time a file's
+    URL, path or truthiness is checked, so this saves a lot of overhead on pages
+    with many images.
+
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._direct_receiver = None
+        self._direct_uid = None
+
+    def connect_direct(self, receiver, dispatch_uid):
+        """
+        Connects the receiver, and calls it directly while it's the only one.
+
+        """
+        self.connect(receiver, dispatch_uid=dispatch_uid)
+        self._direct_receiver = receiver
+        self._direct_uid = dispatch_uid
+
+    def disconnect(self, *args, **kwargs):
+        disconnected = super().disconnect(*args, **kwargs)
+        if disconnected and not self._is_direct():
+            self._direct_receiver = self._direct_uid = None
+        return disconnected
+
+    def _is_direct(self):
+        receivers = self.receivers
+        # The first item of the lookup key is the dispatch uid.
+        return (self._direct_receiver is not None and len(receivers) == 1
+                and receivers[0][0][0] == self._direct_uid)
+
+    def send(self, sender, **named):
+        if self._is_direct():
+            receiver = self._direct_receiver
+            return [(receiver, receiver(signal=self, sender=sender, **named))]
+        return super().send(sender, **named)
+
+
 # Generated file signals
-content_required = Signal()
-existence_required = Signal()
+content_required = DirectSignal()
+existence_required = DirectSignal()
 
 # Source group signals
 source_saved = Signal()
@@ -0,0 +1,172 @@
+"""
+Functions for predicting the size of the image produced by a list of processors
+from the size of the source image, without decoding it. This lets the
+dimensions of cache files be known (e.g. for the ``width`` and ``height``
+attributes of ``<img>`` tags) before they're generated.
+
+Processors can describe how they change the size of an image by defining a
+``get_output_size(size)`` method that returns the new ``(width, height)``
+tuple, or ``None`` if it can't be known without looking at the image. The
+processors included with ImageKit (which come from pilkit) are described by the
+functions registered in this module instead.
+
+"""
+
+from .processors import (AddBorder, Adjust, ColorOverlay, Convert, Crop,
+                         GaussianBlur, MakeOpaque, ProcessorPipeline,
+                         Reflection, Resize, ResizeCanvas, ResizeToCover,
+                         ResizeToFill, ResizeToFit, SmartCrop, SmartResize,
+                         Thumbnail, Transpose)
+
+size_functions = {}
+"""
+Functions returning the output size of instances of processor classes, keyed by
+class. Subclasses use the function of their closest registered base class.
+
+"""
+
+
+def register_size_function(*classes):
+    """
+    A decorator that registers a function of a processor and a size as the
+    size function of the provided processor classes.
+
+    """
+    def decorator(fn):
+        for cls in classes:
+            size_functions[cls] = fn
+        return fn
+    return decorator
+
+
+def get_processor_output_size(processor, size):
+    """
+    Returns the size of the image ``processor`` produces from an image of the
+    provided size, or ``None`` if it can't be predicted.
+
+    """
+    method = getattr(processor, 'get_output_size', None)
+    if method is not None:
+        return method(size)
+    for cls in type(processor).__mro__:
+        fn = size_functions.get(cls)
+        if fn is not None:
+            return fn(processor, size)
+    return None
+
+
+def get_output_size(processors, size):
+    """
+    Returns the size of the image produced by running ``processors`` on an
+    image of the provided size, or ``None`` if any of them can't be predicted.
+
+    """
+    for processor in processors or []:
+        if not size or not all(size):
+            return None
+        size = get_processor_output_size(processor, size)
+    return tuple(size) if size and all(size) else None
+
+
+def _scale(size, ratio):
+    return int(round(size[0] * ratio)), int(round(size[1] * ratio))
+
+
+@register_size_function(ProcessorPipeline)
+def _pipeline_size(processor, size):
+    return get_output_size(list(processor), size)
+
+
+@register_size_function(Adjust, ColorOverlay, Convert, GaussianBlur,
+                        MakeOpaque)
+def _same_size(processor, size):
+    return size
+
+
+@register_size_function(Resize)
+def _resize_size(processor, size):
+    if processor.width is None or processor.height is None:
+        return None
+    if processor.upscale or (processor.width < size[0]
+                             and processor.height < size[1]):
+        return processor.width, processor.height
+    return size
+
+
+@register_size_function(ResizeToCover)
+def _resize_to_cover_size(processor, size):
+    if not processor.width or not processor.height:
+        return None
+    ratio = max(float(processor.width) / size[0],
+                float(processor.height) / size[1])
+    return _resize_size(Resize(*_scale(size, ratio),
+                               upscale=processor.upscale), size)
+
+
+@register_size_function(Crop, SmartCrop)
+def _crop_size(processor, size):
+    if processor.width is None or processor.height is None:
+        return None
+    return min(size[0], processor.width), min(size[1], processor.height)
+
+
+@register_size_function(ResizeToFill, SmartResize)
+def _resize_to_fill_size(processor, size):
+    size = _resize_to_cover_size(processor, size)
+    return size and _crop_size(processor, size)
+
+
+@register_size_function(ResizeCanvas)
+def _resize_canvas_size(processor, size):
+    return processor.width, processor.height
+
+
+@register_size_function(AddBorder)
+def _add_border_size(processor, size):
+    return (size[0] + processor.left + processor.right,
+            size[1] + processor.top + processor.bottom)
+
+
+@register_size_function(ResizeToFit)
+def _resize_to_fit_size(processor, size):
+    if processor.width is not None and processor.height is not None:
+        ratio = min(float(processor.width) / size[0],
+                    float(processor.height) / size[1])
+    elif processor.width is not None:
+        ratio = float(processor.width) / size[0]
+    elif processor.height is not None:
+        ratio = float(processor.height) / size[1]
+    else:
+        return None
+    size = _resize_size(Resize(*_scale(size, ratio),
+                               upscale=processor.upscale), size)
+    if processor.mat_color is not None:
+        return _resize_canvas_size(processor, size)
+    return size
+
+
+@register_size_function(Thumbnail)
+def _thumbnail_size(processor, size):
+    if processor.crop:
+        if not processor.width or not processor.height:
+            return None
+        return _resize_to_fill_size(processor, size)
+    return _resize_to_fit_size(
+        ResizeToFit(processor.width, processor.height,
+                    upscale=processor.upscale), size)
+
+
+@register_size_function(Reflection)
+def _reflection_size(processor, size):
+    return size[0], size[1] + int(size[1] * processor.size)
+
+
+@register_size_function(Transpose)
+def _transpose_size(processor, size):
+    if Transpose.AUTO in processor.methods:
+        # This depends on the EXIF data of the image.
+        return None
+    for method in processor.methods:
+        if method in (Transpose.ROTATE_90, Transpose.ROTATE_270):
+            size = size[1], size[0]
+    return size
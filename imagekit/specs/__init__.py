@@ -1,13 +1,15 @@
+import inspect
 from copy import copy
 
 from django.conf import settings
 from django.db.models.fields.files import ImageFieldFile
 
-from .. import hashers
+from ..decoding import get_shared_source, shrink_on_load
 from ..cachefiles.backends import get_default_cachefile_backend
 from ..cachefiles.strategies import load_strategy
 from ..exceptions import AlreadyRegistered, MissingSource
 from ..registry import generator_registry, register
+from ..sizes import get_output_size
 from ..utils import get_by_qname, open_image, process_image
 
 
@@ -129,17 +131,125 @@ class ImageSpec(BaseImageSpec):
                 'attname': getattr(field, 'name', None),
             }
             state.pop('_source', None)
+        state.pop('_hash_template', None)
         return state
 
-    def get_hash(self):
-        return hashers.pickle([
-            self.source.name,
+    _hash_attrs = ('processors', 'format', 'options', 'autoconvert')
+
+    def _get_hash_template(self, hasher):
+        """
+        Returns a ``HashTemplate`` for the parts of the hash that don't depend
+        on the source, or ``None`` if they can't be cached because they're
+        computed dynamically (e.g. by properties) or the hasher doesn't support
+        templates.
+
+        Templates are cached on the class when the attributes are class
+        attributes and on the instance when they've been set on the instance.
+        Either way, they're recomputed when one of the attributes is reassigned.
+
+        """
+        template_class = getattr(hasher, 'template', None)
+        if template_class is None:
+            return None
+
+        cls = self.__class__
+        values = [getattr(self, attr) for attr in self._hash_attrs]
+        # The key holds the values themselves (rather than, e.g., their ids,
+        # which can be reused once they're freed) and is compared by identity.
+        key = (hasher,) + tuple(values)
+
+        if any(attr not in self.__dict__
+               and hasattr(inspect.getattr_static(cls, attr), '__get__')
+               for attr in self._hash_attrs):
+            return None
+        elif any(attr in self.__dict__ for attr in self._hash_attrs):
+            holder = self.__dict__
+        else:
+            holder = cls.__dict__
+
+        cached = holder.get('_hash_template')
+        if cached is not None and all(
+                a is b for a, b in zip(cached[0], key)):
+            return cached[1]
+        template = template_class([None] + values)
+        if holder is self.__dict__:
+            self._hash_template = (key, template)
+        else:
+            setattr(cls, '_hash_template', (key, template))
+        return template
+
+    def invalidate_hash(self):
+        """
+        Discards the cached hash of this spec's processors, format, options
+        and autoconvert values. Cached hashes are recomputed automatically when
+        one of these attributes is reassigned, but you must call this if you
+        modify one of them in place (e.g. by appending a processor).
+
+        """
+        self.__dict__.pop('_hash_template', None)
+        if '_hash_template' in self.__class__.__dict__:
+            delattr(self.__class__, '_hash_template')
+
+    def get_hash(self, source_key=None):
+        """
+        Returns a hash of the source name and the settings of the spec.
+        ``source_key`` can be used to identify the source by something other
+        than its name (see ``imagekit.cachefiles.namers.source_digest``).
+
+        """
+        hasher = get_by_qname(settings.IMAGEKIT_SPEC_HASHER, 'hasher')
+        name = self.source.name if source_key is None else source_key
+        if isinstance(name, str):
+            template = self._get_hash_template(hasher)
+            if template is not None:
+                return template.hash(name)
+        return hasher([
+            name,
             self.processors,
             self.format,
             self.options,
             self.autoconvert,
         ])
 
+    def get_source_size(self):
+        """
+        Returns the dimensions of the source image if they can be known without
+        reading it: from the ``width_field`` and ``height_field`` of its model
+        field, or from a previous read of its header. Returns ``None``
+        otherwise.
+
+        """
+        source = self.source
+        if not source:
+            return None
+        size = getattr(source, '_dimensions_cache', None)
+        if size and all(size):
+            return tuple(size)
+        field = getattr(source, 'field', None)
+        instance = getattr(source, 'instance', None)
+        width_field = getattr(field, 'width_field', None)
+        height_field = getattr(field, 'height_field', None)
+        if instance is not None and width_field and height_field:
+            size = (getattr(instance, width_field, None),
+                    getattr(instance, height_field, None))
+            if all(size):
+                return size
+        return None
+
+    def get_output_size(self, source_size=None):
+        """
+        Predicts the dimensions of the generated image from those of the
+        source (see ``get_source_size``), without generating it. Returns
+        ``None`` if they can't be predicted, for example because one of the
+        processors doesn't support it. (See :mod:`imagekit.sizes`.)
+
+        """
+        if source_size is None:
+            source_size = self.get_source_size()
+        if source_size is None:
+            return None
+        return get_output_size(self.processors, source_size)
+
     def generate(self):
         if not self.source:
             raise MissingSource("The spec '%s' has no source file associated"
@@ -156,9 +266,17 @@ class ImageSpec(BaseImageSpec):
             self.source.open()
 
         try:
-            img = open_image(self.source)
+            processors = self.processors
+            shared = get_shared_source(self.source)
+            img = None
+            if shared is not None:
+                img, processors = shared.open_image(processors)
+            if img is None:
+                img = open_image(self.source)
+                if settings.IMAGEKIT_SHRINK_ON_LOAD:
+                    img = shrink_on_load(img, processors)
             new_image = process_image(img,
-                                      processors=self.processors,
+                                      processors=processors,
                                       format=self.format,
                                       autoconvert=self.autoconvert,
                                       options=self.options)
@@ -11,13 +11,51 @@ have two responsibilities:
 """
 
 import inspect
+from datetime import datetime
 
+from django.db.models import IntegerField
+from django.db.models.functions import Mod
 from django.db.models.signals import post_init, post_save
+from django.utils import timezone
 from django.utils.functional import wraps
 
 from ..cachefiles import LazyImageCacheFile
+from ..cachefiles.namers import refresh_source_digest
 from ..signals import source_saved
-from ..utils import get_nonabstract_descendants
+from ..utils import get_nonabstract_descendants, get_shard
+
+
+def modified_since(file, since):
+    """
+    Returns whether the file was modified at or after ``since``. Files whose
+    modification time the storage can't tell are assumed to have been.
+
+    """
+    if not file:
+        return False
+    try:
+        modified = file.storage.get_modified_time(file.name)
+    except (NotImplementedError, OSError):
+        return True
+    if timezone.is_aware(modified) != timezone.is_aware(since):
+        if timezone.is_aware(since):
+            modified = timezone.make_aware(modified)
+        else:
+            modified = timezone.make_naive(modified)
+    return modified >= since
+
+
+def get_source_position(file):
+    """
+    Returns a ``(model_label, pk)`` tuple identifying the model instance a
+    source file belongs to (or ``None``), for use with the ``after`` argument
+    of ``ImageFieldSourceGroup.files()``.
+
+    """
+    instance = getattr(file, 'instance', None)
+    if instance is None or instance.pk is None:
+        return None
+    return instance._meta.label, instance.pk
 
 
 def ik_model_receiver(fn):
@@ -30,13 +68,13 @@ def ik_model_receiver(fn):
     def receiver(self, sender, **kwargs):
         if not inspect.isclass(sender):
             return
-        for src in self._source_groups:
-            if issubclass(sender, src.model_class):
-                fn(self, sender=sender, **kwargs)
-
-                # If we find a match, return. We don't want to handle the signal
-                # more than once.
-                return
+        # The source groups of each model are cached (see
+        # ``ModelSignalRouter.get_source_groups()``), so that models without
+        # any only cost a dict lookup.
+        if self.get_source_groups(sender):
+            # We don't want to handle the signal more than once, even if more
+            # than one source group matches.
+            fn(self, sender=sender, **kwargs)
     return receiver
 
 
@@ -56,65 +94,98 @@ class ModelSignalRouter:
 
     def __init__(self):
         self._source_groups = []
+        # Maps model classes to a tuple of their source groups and a set of
+        # their source fields.
+        self._model_cache = {}
         uid = 'ik_spec_field_receivers'
         post_init.connect(self.post_init_receiver, dispatch_uid=uid)
         post_save.connect(self.post_save_receiver, dispatch_uid=uid)
 
     def add(self, source_group):
         self._source_groups.append(source_group)
+        self._model_cache = {}
+
+    def _get_model_info(self, model_class):
+        try:
+            return self._model_cache[model_class]
+        except KeyError:
+            pass
+        source_groups = tuple(
+            src for src in self._source_groups
+            if issubclass(model_class, src.model_class))
+        info = self._model_cache[model_class] = (
+            source_groups, frozenset(src.image_field for src in source_groups))
+        return info
+
+    def get_source_groups(self, model_class):
+        """
+        Returns the source groups of the model class (and its bases).
+
+        """
+        return self._get_model_info(model_class)[0]
 
     def init_instance(self, instance):
         instance._ik = getattr(instance, '_ik', {})
 
-    def update_source_hashes(self, instance):
+    def get_source_names(self, instance):
         """
-        Stores hashes of the source image files so that they can be compared
-        later to see whether the source image has changed (and therefore whether
-        the spec file needs to be regenerated).
+        Returns the names of the source image files, so that they can be
+        compared later to see whether the source image has changed (and
+        therefore whether the spec file needs to be regenerated).
+
+        The names are read from the raw attribute values, without creating
+        ``FieldFile`` objects (or loading deferred fields, which are omitted),
+        so this is cheap enough to do for every instance.
 
         """
+        names = {}
+        for attname in self.get_source_fields(instance):
+            try:
+                value = instance.__dict__[attname]
+            except KeyError:
+                continue
+            if value is not None and not isinstance(value, str):
+                value = getattr(value, 'name', None)
+            names[attname] = value
+        return names
+
+    def update_source_names(self, instance):
         self.init_instance(instance)
-        instance._ik['source_hashes'] = {
-            attname: hash(getattr(instance, attname))
-            for attname in self.get_source_fields(instance)}
-        return instance._ik['source_hashes']
+        instance._ik['source_names'] = self.get_source_names(instance)
+        return instance._ik['source_names']
 
     def get_source_fields(self, instance):
         """
         Returns a list of the source fields for the given instance.
 
         """
-        return {
-            src.image_field
-            for src in self._source_groups
-            if isinstance(instance, src.model_class)}
+        return self._get_model_info(type(instance))[1]
 
     @ik_model_receiver
     def post_save_receiver(self, sender, instance=None, created=False, update_fields=None, raw=False, **kwargs):
         if not raw:
             self.init_instance(instance)
-            old_hashes = instance._ik.get('source_hashes', {}).copy()
-            new_hashes = self.update_source_hashes(instance)
+            old_names = instance._ik.get('source_names', {})
             for attname in self.get_source_fields(instance):
                 if update_fields and attname not in update_fields:
                     continue
+                if attname not in old_names and attname not in instance.__dict__:
+                    # The field is still deferred, so it wasn't changed.
+                    continue
 
                 file = getattr(instance, attname)
-                if file and old_hashes.get(attname) != new_hashes[attname]:
+                if file and (created or attname not in old_names
+                             or old_names[attname] != file.name):
+                    # Once, however many source groups the field has, and
+                    # before their specs' files are named.
+                    refresh_source_digest(file)
                     self.dispatch_signal(source_saved, file, sender, instance,
                                          attname)
+            self.update_source_names(instance)
 
     @ik_model_receiver
     def post_init_receiver(self, sender, instance=None, **kwargs):
-        self.init_instance(instance)
-        source_fields = self.get_source_fields(instance)
-        local_fields = {
-            field.name: field
-            for field in instance._meta.local_fields
-            if field.name in source_fields}
-        instance._ik['source_hashes'] = {
-            attname: hash(file_field)
-            for attname, file_field in local_fields.items()}
+        self.update_source_names(instance)
 
     def dispatch_signal(self, signal, file, model_class, instance, attname):
         """
@@ -123,8 +194,8 @@ class ModelSignalRouter:
         important that we dispatch the signal for each.
 
         """
-        for source_group in self._source_groups:
-            if issubclass(model_class, source_group.model_class) and source_group.image_field == attname:
+        for source_group in self.get_source_groups(model_class):
+            if source_group.image_field == attname:
                 signal.send(sender=source_group, source=file)
 
 
@@ -134,21 +205,107 @@ class ImageFieldSourceGroup:
     model and its subclasses.
 
     """
+    resumable = True
+    chunk_size = 2000
+
     def __init__(self, model_class, image_field):
         self.model_class = model_class
         self.image_field = image_field
         signal_router.add(self)
 
-    def files(self):
+    def files(self, after=None, since=None, shard=None):
         """
         A generator that returns the source files that this source group
         represents; in this case, a particular field of every instance of a
         particular model and its subclasses.
 
+        The instances of each model are returned in primary key order, so that
+        an interrupted iteration can be resumed: ``after`` maps model labels
+        (see ``get_source_position()``) to the primary key of the last
+        instance that was processed, and only the instances after it are returned. ``since``
+        limits the files to those of recently added or changed instances; it
+        can be a primary key or a datetime. (Datetimes are compared with the
+        model's ``get_latest_by`` field, or, if it doesn't have one, with the
+        modification time of the source file.)
+
+        ``shard`` is an ``(index, count)`` tuple that limits the files to one
+        of ``count`` disjoint parts (numbered from zero), so that they can be
+        processed on several machines. Instances are partitioned by primary
+        key when it's an integer, and by a hash of the source file name
+        otherwise.
+
         """
+        after = after or {}
         for model in get_nonabstract_descendants(self.model_class):
-            for instance in model.objects.all().iterator():
-                yield getattr(instance, self.image_field)
+            yield from self.model_files(model, after.get(model._meta.label),
+                                        since, shard)
+
+    def model_files(self, model, last_pk=None, since=None, shard=None):
+        """
+        Yields the (non-empty) source files of the instances of one model.
+
+        Only the primary key and the columns of the image field are read, a
+        chunk of ``chunk_size`` rows at a time, and the files are bound to
+        deferred instances (whose other fields are loaded if they're accessed,
+        e.g. by a spec that depends on them).
+
+        """
+        field = model._meta.get_field(self.image_field)
+        wanted = {model._meta.pk.attname, field.attname}
+        for name in (field.width_field, field.height_field):
+            # Without these, Django would load them one instance at a time
+            # to check whether the dimensions are filled.
+            if name:
+                wanted.add(model._meta.get_field(name).attname)
+        # ``from_db()`` expects the values in the order of the model's fields
+        # (which, e.g. for multi-table inheritance, doesn't start with the
+        # primary key).
+        field_names = [f.attname for f in model._meta.concrete_fields
+                       if f.attname in wanted]
+        pk_index = field_names.index(model._meta.pk.attname)
+
+        queryset = (model.objects.order_by('pk')
+                    .exclude(**{'%s__isnull' % field.attname: True})
+                    .exclude(**{field.attname: ''}))
+        shard_by_name = False
+        if shard is not None:
+            index, count = shard
+            pk = model._meta.pk
+            if pk.is_relation:
+                pk = pk.target_field
+            if isinstance(pk, IntegerField):
+                queryset = queryset.alias(
+                    _ik_shard=Mod('pk', count)).filter(_ik_shard=index)
+            else:
+                shard_by_name = True
+        check_modified_time = False
+        if isinstance(since, datetime):
+            latest_by = model._meta.get_latest_by
+            if isinstance(latest_by, str):
+                queryset = queryset.filter(
+                    **{'%s__gte' % latest_by.lstrip('-'): since})
+            else:
+                check_modified_time = True
+        elif since is not None:
+            queryset = queryset.filter(pk__gt=since)
+        queryset = queryset.values_list(*field_names)
+
+        while True:
+            chunk = queryset
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            rows = list(chunk[:self.chunk_size])
+            for row in rows:
+                instance = model.from_db(queryset.db, field_names, row)
+                file = getattr(instance, field.attname)
+                if check_modified_time and not modified_since(file, since):
+                    continue
+                if shard_by_name and get_shard(file.name, count) != index:
+                    continue
+                yield file
+            if len(rows) < self.chunk_size:
+                break
+            last_pk = rows[-1][pk_index]
 
 
 class SourceGroupFilesGenerator:
@@ -170,8 +327,17 @@ class SourceGroupFilesGenerator:
     def __hash__(self):
         return hash((self.source_group, self.generator_id))
 
-    def __call__(self):
-        for source_file in self.source_group.files():
+    @property
+    def resumable(self):
+        """
+        Whether the files can be filtered with the ``after``, ``since`` and
+        ``shard`` arguments (see ``ImageFieldSourceGroup.files()``).
+
+        """
+        return getattr(self.source_group, 'resumable', False)
+
+    def __call__(self, **kwargs):
+        for source_file in self.source_group.files(**kwargs):
             yield LazyImageCacheFile(self.generator_id,
                                               source=source_file)
 
@@ -1,10 +1,11 @@
 from django import template
+from django.conf import settings
 from django.template.library import parse_bits
 from django.utils.encoding import force_str
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
 
-from ..cachefiles import ImageCacheFile
+from ..cachefiles import ImageCacheFile, prime_cachefiles
 from ..registry import generator_registry
 
 register = template.Library()
@@ -22,6 +23,24 @@ def get_cachefile(context, generator_id, generator_kwargs, source=None):
     return ImageCacheFile(generator)
 
 
+def render_img(file, attrs):
+    if file.failed:
+        # Don't try to generate (or measure) a file that can't be generated.
+        if not settings.IMAGEKIT_FAILED_IMAGE_URL:
+            return ''
+        attrs['src'] = settings.IMAGEKIT_FAILED_IMAGE_URL
+    else:
+        # Only add width and height if neither is specified (to allow for
+        # proportional in-browser scaling).
+        if 'width' not in attrs and 'height' not in attrs:
+            attrs.update(width=file.width, height=file.height)
+
+        attrs['src'] = file.url
+    attr_str = ' '.join('%s="%s"' % (escape(k), escape(v)) for k, v in
+            attrs.items())
+    return mark_safe('<img %s />' % attr_str)
+
+
 def parse_dimensions(dimensions):
     """
     Parse the width and height values from a dimension string. Valid values are
@@ -61,16 +80,7 @@ class GenerateImageTagNode(template.Node):
         file = get_cachefile(context, self._generator_id,
                 self._generator_kwargs)
         attrs = {k: v.resolve(context) for k, v in self._html_attrs.items()}
-
-        # Only add width and height if neither is specified (to allow for
-        # proportional in-browser scaling).
-        if 'width' not in attrs and 'height' not in attrs:
-            attrs.update(width=file.width, height=file.height)
-
-        attrs['src'] = file.url
-        attr_str = ' '.join('%s="%s"' % (escape(k), escape(v)) for k, v in
-                attrs.items())
-        return mark_safe('<img %s />' % attr_str)
+        return render_img(file, attrs)
 
 
 class ThumbnailAssignmentNode(template.Node):
@@ -129,16 +139,24 @@ class ThumbnailImageTagNode(template.Node):
         file = ImageCacheFile(generator)
 
         attrs = {k: v.resolve(context) for k, v in self._html_attrs.items()}
+        return render_img(file, attrs)
 
-        # Only add width and height if neither is specified (to allow for
-        # proportional in-browser scaling).
-        if 'width' not in attrs and 'height' not in attrs:
-            attrs.update(width=file.width, height=file.height)
 
-        attrs['src'] = file.url
-        attr_str = ' '.join('%s="%s"' % (escape(k), escape(v)) for k, v in
-                attrs.items())
-        return mark_safe('<img %s />' % attr_str)
+class PrimeImagesNode(template.Node):
+
+    def __init__(self, items, attrs):
+        self._items = items
+        self._attrs = attrs
+
+    def render(self, context):
+        items = self._items.resolve(context) or []
+        attrs = [attr.resolve(context) for attr in self._attrs]
+        if attrs:
+            files = [getattr(item, attr) for item in items for attr in attrs]
+        else:
+            files = items
+        prime_cachefiles(files)
+        return ''
 
 
 def parse_ik_tag_bits(parser, bits):
@@ -282,3 +300,29 @@ def thumbnail(parser, token):
     else:
         return ThumbnailImageTagNode(generator_id, dimensions, source, kwargs,
                 html_attrs)
+
+
+@register.tag
+def primeimages(parser, token):
+    """
+    Loads the state of many cache files at once, so that displaying them
+    doesn't require a cache lookup for each one. For example::
+
+        {% primeimages thumbnails %}
+
+    If the attribute names of the files are provided, they're looked up on
+    each of the items instead::
+
+        {% primeimages photos 'thumbnail' 'avatar' %}
+        {% for photo in photos %}
+            <img src="{{ photo.thumbnail.url }}" />
+        {% endfor %}
+
+    """
+    bits = token.split_contents()
+    tag_name = bits.pop(0)
+    if not bits:
+        raise template.TemplateSyntaxError('The "%s" tag requires at least'
+                ' one argument: the items to prime.' % tag_name)
+    return PrimeImagesNode(parser.compile_filter(bits[0]),
+                           [parser.compile_filter(bit) for bit in bits[1:]])
@@ -1,5 +1,10 @@
 import logging
+import posixpath
 import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
 from hashlib import md5
 from importlib import import_module
 
@@ -141,6 +146,138 @@ def get_storage():
             )
 
 
+def walk_storage(storage, path=''):
+    """
+    Yields the names of all of the files under ``path`` in the storage,
+    listing one directory at a time. Storages that can list a prefix more
+    efficiently (e.g. object stores that don't have real directories) can
+    provide a ``walk_files(path)`` method that yields the names instead.
+
+    """
+    walk_files = getattr(storage, 'walk_files', None)
+    if walk_files is not None:
+        yield from walk_files(path)
+        return
+    try:
+        dirs, files = storage.listdir(path)
+    except FileNotFoundError:
+        return
+    for name in files:
+        yield posixpath.join(path, name)
+    for name in dirs:
+        yield from walk_storage(storage, posixpath.join(path, name))
+
+
+def chunked(iterable, size):
+    """
+    Yields lists of (at most) ``size`` consecutive items of the iterable.
+
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def get_shard(name, count):
+    """
+    Returns the index (from zero) of the shard that the name belongs to when
+    names are partitioned into ``count`` shards. Unlike ``hash()``, this is the
+    same in every process.
+
+    """
+    return zlib.crc32(name.encode('utf-8')) % count
+
+
+class LRUCache:
+    """
+    A small, thread-safe, in-memory mapping that holds at most ``maxsize``
+    items, discarding the least recently used ones first.
+
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _TimedEntry:
+    __slots__ = ('value', 'expires')
+
+    def __init__(self, value, expires):
+        self.value = value
+        self.expires = expires
+
+
+class TimedLRUCache(LRUCache):
+    """
+    An ``LRUCache`` whose items expire ``timeout`` seconds after they're set.
+    The number of lookups that found (``hits``) and didn't find (``misses``)
+    an item are counted.
+
+    """
+    def __init__(self, maxsize, timeout):
+        super().__init__(maxsize)
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        entry = super().get(key)
+        if entry is not None and entry.expires <= time.monotonic():
+            self.pop(key)
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+        return entry.value
+
+    def set(self, key, value):
+        super().set(key, _TimedEntry(value, time.monotonic() + self.timeout))
+
+    def clear(self):
+        super().clear()
+        with self._lock:
+            self.hits = self.misses = 0
+
+
 def sanitize_cache_key(key):
     if settings.IMAGEKIT_USE_MEMCACHED_SAFE_CACHE_KEY:
         # Memcached keys can't contain whitespace or control characters.
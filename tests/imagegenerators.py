@@ -1,5 +1,8 @@
-from imagekit import ImageSpec, register
+from PIL import Image
+
+from imagekit import ImageSpec, hashers, register
 from imagekit.processors import ResizeToFill
+from imagekit.utils import img_to_fobj
 
 
 class TestSpec(ImageSpec):
@@ -14,3 +17,23 @@ class ResizeTo1PixelSquare(ImageSpec):
 
 register.generator('testspec', TestSpec)
 register.generator('1pxsq', ResizeTo1PixelSquare)
+
+
+class SolidColor:
+    """
+    A generator without a source.
+
+    """
+    format = 'PNG'
+
+    def __init__(self, color='red'):
+        self.color = color
+
+    def get_hash(self):
+        return hashers.pickle(['solidcolor', self.color])
+
+    def generate(self):
+        return img_to_fobj(Image.new('RGB', (10, 10), self.color), 'PNG')
+
+
+register.generator('solidcolor', SolidColor)
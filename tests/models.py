@@ -1,7 +1,8 @@
 from django.db import models
 
 from imagekit import ImageSpec
-from imagekit.models import ImageSpecField, ProcessedImageField
+from imagekit.models import (ImageKitQuerySet, ImageSpecField,
+                             ProcessedImageField)
 from imagekit.processors import Adjust, ResizeToFill, SmartCrop
 
 
@@ -27,6 +28,8 @@ class Photo(models.Model):
             sharpness=1.1), SmartCrop(50, 50)], source='original_image',
             format='JPEG', options={'quality': 90})
 
+    objects = ImageKitQuerySet.as_manager()
+
 
 class ProcessedImageFieldModel(models.Model):
     processed = ProcessedImageField([SmartCrop(50, 50)], format='JPEG',
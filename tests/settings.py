@@ -21,6 +21,7 @@ INSTALLED_APPS = [
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'imagekit',
+    'imagekit.manifest',
     'tests',
 ]
 
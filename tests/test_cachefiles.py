@@ -1,16 +1,32 @@
-from hashlib import md5
+import threading
+from concurrent import futures
+from hashlib import md5, sha256
+from io import BytesIO
+from tempfile import NamedTemporaryFile
 from unittest import mock
 
 import pytest
 from django.conf import settings
+from django.core.files.base import ContentFile
 
-from imagekit.cachefiles import ImageCacheFile, LazyImageCacheFile
-from imagekit.cachefiles.backends import Simple
+from imagekit import ImageSpec
+from imagekit.cachefiles import (ImageCacheFile, LazyImageCacheFile,
+                                 prime_cachefiles, seed_cachefile_states)
+from imagekit.cachefiles import namers
+from imagekit.cachefiles.backends import (CacheFileState, Manifest,
+                                         ProcessPool, Simple, ThreadPool,
+                                         generate_from_payload,
+                                         get_generation_payload)
+from imagekit.exceptions import GenerationFailed
+from imagekit.manifest.models import ManifestEntry
+from imagekit.processors import ResizeToFill
+from imagekit.registry import generator_registry
+from imagekit.utils import TimedLRUCache
 
 from .imagegenerators import TestSpec
 from .utils import (DummyAsyncCacheFileBackend, assert_file_is_falsy,
-                    assert_file_is_truthy, get_image_file,
-                    get_unique_image_file)
+                    assert_file_is_truthy, create_photo, get_html_attrs,
+                    get_image_file, get_unique_image_file, render_tag)
 
 
 def test_no_source_falsiness():
@@ -114,3 +130,462 @@ def test_lazyfile_stringification():
     file.name = 'a.jpg'
     assert str(file) == 'a.jpg'
     assert repr(file) == '<ImageCacheFile: a.jpg>'
+
+
+def test_thread_pool_backend():
+    backend = ThreadPool()
+    spec = TestSpec(source=get_unique_image_file())
+    file = ImageCacheFile(spec, cachefile_backend=backend)
+    future = file.cachefile_backend.generate(file)
+    future.result(timeout=10)
+    assert backend.exists(file)
+
+
+def test_thread_pool_single_flight():
+    """
+    Ensure concurrent requests for the same file result in a single job.
+
+    """
+    backend = ThreadPool()
+    spec = TestSpec(source=get_unique_image_file())
+    file = ImageCacheFile(spec, cachefile_backend=backend)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def generate(self):
+        calls.append(self.name)
+        started.set()
+        release.wait(10)
+
+    with mock.patch.object(ImageCacheFile, '_generate', generate):
+        first = backend.schedule_generation(file)
+        started.wait(10)
+        assert backend.schedule_generation(file) is first
+        with pytest.raises(futures.TimeoutError):
+            backend.wait(file, timeout=0.01)
+        release.set()
+        backend.wait(file, timeout=10)
+    assert calls == [file.name]
+    assert backend.get_future(file) is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_generation_payload(django_assert_num_queries):
+    photo = create_photo('payload.jpg')
+    file = photo.thumbnail
+    payload = get_generation_payload(file)
+    assert payload == (
+        'tests:photo:thumbnail', {},
+        ('tests.Photo', 'original_image', photo.pk, photo.original_image.name),
+        file.name)
+
+    # Workers don't need to query the source's row again.
+    with django_assert_num_queries(0):
+        generate_from_payload(payload)
+    assert file.storage.exists(file.name)
+
+
+def test_no_generation_payload_for_unregistered_generators():
+    spec = TestSpec(source=get_unique_image_file())
+    assert get_generation_payload(ImageCacheFile(spec)) is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_thread_pool_jobs_have_their_own_sources():
+    """
+    The specs of a source share its file object, which several workers can't
+    read at once.
+
+    """
+    photo = create_photo('fanout.jpg')
+    source = photo.original_image
+    backend = ThreadPool()
+    backend.max_workers = 4
+    files = []
+    for size in range(10, 90, 10):
+        spec = type('Spec', (ImageSpec,),
+                    {'processors': [ResizeToFill(size, size)]})
+        files.append(ImageCacheFile(spec(source=source),
+                                    cachefile_backend=backend))
+
+    worker_sources = []
+    generate_file = backend._generate_file
+
+    def record_source(file, *args):
+        worker_sources.append(file.generator.source)
+        return generate_file(file, *args)
+
+    with mock.patch.object(backend, '_generate_file', record_source):
+        jobs = [backend.schedule_generation(file) for file in files]
+        for job in jobs:
+            job.result(timeout=30)
+    assert all(backend.exists(file) for file in files)
+    assert len({id(s) for s in worker_sources + [source]}) == len(files) + 1
+    assert all(s.name == source.name for s in worker_sources)
+
+
+def test_process_pool_backend():
+    backend = ProcessPool()
+    file = ImageCacheFile(generator_registry.get('solidcolor', color='blue'),
+                          cachefile_backend=backend)
+    try:
+        backend.generate(file).result(timeout=60)
+    finally:
+        backend.executor.shutdown()
+    assert file.storage.exists(file.name)
+    assert backend.exists(file)
+
+
+def test_process_pool_only_records_generated_files():
+    """
+    Workers don't generate files that another process is generating, so the
+    parent mustn't record them as existing.
+
+    """
+    backend = ProcessPool()
+    file = ImageCacheFile(generator_registry.get('solidcolor', color='green'),
+                          cachefile_backend=backend)
+    future = futures.Future()
+    future.set_result((False, None))
+    backend._generation_done(file, future)
+    assert backend.get_state(file) != CacheFileState.EXISTS
+
+    future = futures.Future()
+    future.set_result((True, {'width': 10, 'height': 10}))
+    backend._generation_done(file, future)
+    assert backend.get_state(file) == CacheFileState.EXISTS
+
+
+def test_generation_lock_is_released():
+    backend = Simple()
+    spec = TestSpec(source=get_unique_image_file())
+    file = ImageCacheFile(spec, cachefile_backend=backend)
+    file.generate()
+    assert backend.exists(file)
+    assert not backend.is_locked(file)
+
+
+def test_only_lock_owner_generates():
+    """
+    Ensure a file isn't generated while another process holds the lock, and
+    that waiting for it is bounded.
+
+    """
+    backend = Simple()
+    backend.generation_wait_timeout = 0.05
+    spec = TestSpec(source=get_unique_image_file())
+    file = ImageCacheFile(spec, cachefile_backend=backend)
+    token = backend.acquire_lock(file)
+    assert token is not None
+    assert backend.acquire_lock(file) is None
+    try:
+        with mock.patch.object(ImageCacheFile, '_generate') as generate:
+            backend.generate_now(file)
+        assert not generate.called
+    finally:
+        backend.release_lock(file, token)
+
+
+def test_waits_for_lock_owner():
+    backend = Simple()
+    spec = TestSpec(source=get_unique_image_file())
+    file = ImageCacheFile(spec, cachefile_backend=backend)
+    token = backend.acquire_lock(file)
+
+    def finish():
+        backend.set_state(file, CacheFileState.EXISTS)
+        backend.release_lock(file, token)
+
+    timer = threading.Timer(0.05, finish)
+    timer.start()
+    with mock.patch.object(ImageCacheFile, '_generate') as generate:
+        backend.generate_now(file)
+    timer.join()
+    assert not generate.called
+    assert backend.exists(file)
+
+
+def test_get_states():
+    backend = Simple()
+    files = [ImageCacheFile(TestSpec(source=get_unique_image_file()),
+                            cachefile_backend=backend) for _ in range(3)]
+    files[0].generate()
+    backend.cache.delete(backend.get_key(files[0]))
+
+    with mock.patch.object(backend.cache, 'get_many',
+                           wraps=backend.cache.get_many) as get_many:
+        states = backend.get_states(files)
+    assert get_many.call_count == 1
+    assert states == [CacheFileState.EXISTS, CacheFileState.DOES_NOT_EXIST,
+                      CacheFileState.DOES_NOT_EXIST]
+    assert backend.cache.get(backend.get_key(files[1])) == \
+        CacheFileState.DOES_NOT_EXIST
+
+    with mock.patch.object(backend.cache, 'get') as get:
+        assert backend.exists(files[0])
+    assert not get.called
+
+
+def test_prime_cachefiles():
+    backend = Simple()
+    files = [ImageCacheFile(TestSpec(source=get_unique_image_file()),
+                            cachefile_backend=backend) for _ in range(2)]
+    for file in files:
+        file.generate()
+        file._cachefile_state = None
+    prime_cachefiles(files)
+    assert [file._cachefile_state for file in files] == [
+        CacheFileState.EXISTS, CacheFileState.EXISTS]
+
+
+def test_exists_many_listdir_threshold():
+    backend = Simple()
+    files = [ImageCacheFile(TestSpec(source=get_unique_image_file()),
+                            cachefile_backend=backend) for _ in range(2)]
+    files[0].generate()
+    storage = files[0].storage
+
+    # Directories aren't listed by default...
+    with mock.patch.object(storage, 'listdir') as listdir:
+        assert backend._exists_many(files) == [True, False]
+    assert not listdir.called
+
+    # ...but can be when enough of their files are checked at once.
+    backend.listdir_threshold = 2
+    with mock.patch.object(storage, 'exists') as exists, \
+            mock.patch.object(storage, 'listdir',
+                              wraps=storage.listdir) as listdir:
+        assert backend._exists_many(files) == [True, False]
+    assert listdir.call_count == 1
+    assert not exists.called
+
+    backend.listdir_threshold = 3
+    with mock.patch.object(storage, 'listdir') as listdir:
+        assert backend._exists_many(files) == [True, False]
+    assert not listdir.called
+
+
+def test_metadata_is_recorded():
+    backend = Simple()
+    spec = TestSpec(source=get_unique_image_file())
+    ImageCacheFile(spec, cachefile_backend=backend).generate()
+
+    file = ImageCacheFile(spec, cachefile_backend=backend)
+    metadata = backend.get_metadata(file)
+    assert metadata['format'] == 'PNG'
+    assert metadata['mimetype'] == 'image/png'
+
+    with mock.patch.object(file.storage, 'open') as open, \
+            mock.patch.object(file.storage, 'size') as size:
+        assert (file.width, file.height) == (metadata['width'],
+                                             metadata['height'])
+        assert file.size == metadata['size']
+    assert not open.called
+    assert not size.called
+    assert file.size == file.storage.size(file.name)
+
+
+def test_local_cache():
+    backend = Simple()
+    spec = TestSpec(source=get_unique_image_file())
+    ImageCacheFile(spec, cachefile_backend=backend).generate()
+    missing = ImageCacheFile(TestSpec(source=get_unique_image_file()),
+                             cachefile_backend=backend)
+    backend.set_state(missing, CacheFileState.DOES_NOT_EXIST)
+
+    local_cache = TimedLRUCache(10, 30)
+    with mock.patch('imagekit.cachefiles.backends.local_cache', local_cache):
+        assert backend.exists(ImageCacheFile(spec, cachefile_backend=backend))
+        with mock.patch.object(backend.cache, 'get') as get:
+            file = ImageCacheFile(spec, cachefile_backend=backend)
+            assert backend.exists(file)
+        assert not get.called
+        assert (local_cache.hits, local_cache.misses) == (1, 1)
+
+        # Only existence is cached locally.
+        backend.get_state(missing)
+        assert len(local_cache) == 1
+
+        local_cache.timeout = 0
+        backend.set_state(file, CacheFileState.EXISTS)
+        assert local_cache.get(backend.get_key(file)) is None
+
+
+def get_corrupt_file():
+    file = NamedTemporaryFile()
+    file.write(b'not an image')
+    file.flush()
+    return file
+
+
+def test_failure_backoff():
+    backend = Simple()
+    file = ImageCacheFile(TestSpec(source=get_corrupt_file()),
+                          cachefile_backend=backend)
+    with pytest.raises(Exception) as excinfo:
+        file.generate()
+    assert not isinstance(excinfo.value, GenerationFailed)
+    failure = backend.get_failure(file)
+    assert failure['failures'] == 1
+    assert failure['exception'].endswith('UnidentifiedImageError')
+    assert file.failed
+
+    # The file isn't generated again until it's time to retry.
+    with mock.patch.object(ImageCacheFile, '_generate') as generate:
+        with pytest.raises(GenerationFailed):
+            file.generate()
+    assert not generate.called
+
+    # The strategy treats it as missing instead of raising.
+    assert not file
+    file.url
+
+    with mock.patch('time.time', return_value=failure['retry_at'] + 1):
+        assert not file.failed
+        with pytest.raises(Exception):
+            file.generate()
+    failure2 = backend.get_failure(file)
+    assert failure2['failures'] == 2
+    assert failure2['retry_at'] - failure['retry_at'] >= \
+        backend.failure_backoff * 2
+
+
+def test_failed_image_tag(settings):
+    with mock.patch.object(ImageCacheFile, 'failed', True):
+        assert render_tag("{% generateimage 'testspec' source=img %}") == ''
+        settings.IMAGEKIT_FAILED_IMAGE_URL = '/failed.png'
+        assert get_html_attrs(
+            "{% thumbnail '100x100' img %}") == {'src': '/failed.png'}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_manifest(django_assert_num_queries):
+    backend = Manifest()
+    spec = TestSpec(source=get_unique_image_file())
+    generated = ImageCacheFile(spec, cachefile_backend=backend)
+    generated.generate()
+    entry = ManifestEntry.objects.get(name=generated.name)
+    assert entry.source_name == spec.source.name
+    assert (entry.width, entry.height) == (generated.width, generated.height)
+
+    # Existing files that aren't in the manifest yet are found in the storage
+    # and recorded.
+    other = ImageCacheFile(TestSpec(source=get_unique_image_file()),
+                           cachefile_backend=Simple())
+    other.generate()
+    missing = ImageCacheFile(TestSpec(source=get_unique_image_file()),
+                             cachefile_backend=backend)
+
+    backend.cache.clear()
+    files = [ImageCacheFile(spec, cachefile_backend=backend),
+             ImageCacheFile(other.generator, cachefile_backend=backend),
+             missing]
+    assert backend.get_states(files) == [CacheFileState.EXISTS,
+                                         CacheFileState.EXISTS,
+                                         CacheFileState.DOES_NOT_EXIST]
+    assert ManifestEntry.objects.filter(name=other.name).exists()
+    assert not ManifestEntry.objects.filter(name=missing.name).exists()
+    assert backend.get_metadata(files[0])['width'] == entry.width
+
+    backend.cache.clear()
+    file = ImageCacheFile(other.generator, cachefile_backend=backend)
+    with mock.patch.object(file.storage, 'exists') as exists, \
+            django_assert_num_queries(1):
+        assert backend.exists(file)
+    assert not exists.called
+
+
+def test_seed_cachefile_states():
+    backend = Simple()
+    files = [ImageCacheFile(TestSpec(source=get_unique_image_file()),
+                            cachefile_backend=backend) for _ in range(2)]
+    files[0].generate()
+    backend.cache.clear()
+    for file in files:
+        file.__dict__.pop('_cachefile_state', None)
+
+    with mock.patch.object(files[0].storage, 'exists') as exists:
+        listings = seed_cachefile_states(files)
+        assert [backend.get_state(file) for file in files] == [
+            CacheFileState.EXISTS, CacheFileState.DOES_NOT_EXIST]
+    assert not exists.called
+    assert files[0].name in listings[files[0].storage]
+
+    # Storages are only listed once.
+    with mock.patch.object(files[0].storage, 'listdir') as listdir:
+        seed_cachefile_states(files, listings)
+    assert not listdir.called
+
+
+def test_seeded_missing_states_outlive_cache():
+    backend = Simple()
+    file = ImageCacheFile(TestSpec(source=get_unique_image_file()),
+                          cachefile_backend=backend)
+    seed_cachefile_states([file])
+    # The cached states of missing files expire quickly, but bulk operations
+    # may only get to the file much later.
+    backend.cache.clear()
+    with mock.patch.object(file.storage, 'exists') as exists:
+        assert backend.get_state(file) == CacheFileState.DOES_NOT_EXIST
+    assert not exists.called
+
+    file.generate()
+    assert backend.get_state(file) == CacheFileState.EXISTS
+
+
+@pytest.mark.django_db(transaction=True)
+def test_source_digest_namer(settings):
+    """
+    Sources with the same contents share a cache file when using the
+    ``source_digest`` namer, and their digests are recorded when they're saved.
+
+    """
+    settings.IMAGEKIT_SPEC_CACHEFILE_NAMER = \
+        'imagekit.cachefiles.namers.source_digest'
+    photos = [create_photo('digest%s.jpg' % i) for i in range(2)]
+    assert photos[0].original_image.name != photos[1].original_image.name
+
+    with mock.patch('imagekit.cachefiles.namers._read_digest') as read_digest:
+        names = {photo.thumbnail.name for photo in photos}
+    assert not read_digest.called
+    assert len(names) == 1
+    assert names.pop().startswith(settings.IMAGEKIT_CACHEFILE_DIR)
+
+    other = TestSpec(source=photos[0].original_image)
+    other.processors = [ResizeToFill(10, 10)]
+    assert ImageCacheFile(other).name != photos[0].thumbnail.name
+
+
+@pytest.mark.django_db(transaction=True)
+def test_source_digest_is_read_once_on_save(settings):
+    """
+    Sources are only read once when they're saved, before specs that are
+    generated right away (e.g. with the optimistic strategy) are named.
+
+    """
+    settings.IMAGEKIT_SPEC_CACHEFILE_NAMER = \
+        'imagekit.cachefiles.namers.source_digest'
+    with mock.patch.object(ImageSpec, 'cachefile_strategy',
+                           'imagekit.cachefiles.strategies.Optimistic'), \
+            mock.patch('imagekit.cachefiles.namers._read_digest',
+                       wraps=namers._read_digest) as read_digest:
+        photo = create_photo('optimistic_digest.jpg')
+    assert read_digest.call_count == 1
+    for file in (photo.thumbnail, photo.smartcropped_thumbnail):
+        assert file.storage.exists(file.name)
+
+
+def test_source_digest_follows_name_changes():
+    name = get_unique_image_file().name
+    source = ContentFile(b'one', name='%s.one' % name)
+    assert namers.get_source_digest(source) == sha256(b'one').hexdigest()
+
+    # The name of a file can change in place (e.g. when a new file is saved).
+    source.name = '%s.two' % name
+    source.file = BytesIO(b'two')
+    assert namers.get_source_digest(source) == sha256(b'two').hexdigest()
+
+    source.file = BytesIO(b'three')
+    assert namers.get_source_digest(source) == sha256(b'two').hexdigest()
+    assert namers.get_source_digest(source, refresh=True) == \
+        sha256(b'three').hexdigest()
@@ -0,0 +1,178 @@
+from io import BytesIO
+from unittest import mock
+
+from PIL import Image
+
+from imagekit import ImageSpec
+from imagekit.decoding import (get_reduction_factor, intermediate_cache,
+                               share_source, shrink_on_load)
+from imagekit.utils import open_image
+from imagekit.processors import (Adjust, ResizeToFill, ResizeToFit, SmartCrop,
+                                 Thumbnail, Transpose)
+
+
+class CountingProcessor:
+    count = 0
+
+    def process(self, img):
+        CountingProcessor.count += 1
+        return img
+
+
+def create_source(size, format):
+    source = BytesIO()
+    Image.new('RGB', size, (255, 0, 0)).save(source, format)
+    source.seek(0)
+    return source
+
+
+def test_reduction_factor():
+    assert get_reduction_factor([ResizeToFit(100, 100)], (2000, 1000)) == 10
+    assert get_reduction_factor([ResizeToFill(100, 100)], (2000, 1000)) == 5
+    assert get_reduction_factor([Thumbnail(width=500)], (2000, 1000)) == 2
+
+
+def test_no_reduction_for_unknown_processors():
+    assert get_reduction_factor([], (2000, 1000)) == 1
+    assert get_reduction_factor([SmartCrop(100, 100)], (2000, 1000)) == 1
+    assert get_reduction_factor([Adjust(contrast=1.2), ResizeToFit(100, 100)],
+                                (2000, 1000)) == 1
+
+
+def test_no_reduction_when_upscaling():
+    assert get_reduction_factor([ResizeToFit(400, 400)], (500, 500)) == 1
+
+
+def test_transpose_considers_both_orientations():
+    processors = [Transpose(), ResizeToFill(100, 50)]
+    assert get_reduction_factor(processors, (2000, 1000)) == 5
+
+
+def test_jpeg_draft():
+    img = Image.open(create_source((2000, 1000), 'JPEG'))
+    img = shrink_on_load(img, [ResizeToFit(100, 100)])
+    assert img.size == (250, 125)
+    assert img.format == 'JPEG'
+
+
+def test_reduce():
+    img = Image.open(create_source((2000, 1000), 'PNG'))
+    img = shrink_on_load(img, [ResizeToFit(100, 100)])
+    assert img.size == (200, 100)
+    assert img.format == 'PNG'
+
+
+def test_generated_size_is_unaffected():
+    class Spec(ImageSpec):
+        processors = [ResizeToFill(120, 80)]
+
+    for format in ('JPEG', 'PNG'):
+        spec = Spec(source=create_source((2400, 1800), format))
+        img = Image.open(spec.generate())
+        assert img.size == (120, 80)
+        assert img.format == format
+
+
+def test_generated_size_is_unaffected_for_uneven_sizes(settings):
+    """
+    Reduced sizes are rounded, which can change the aspect ratio of the image;
+    it's only shrunk when that doesn't change the size of the result.
+
+    """
+    processors = [ResizeToFit(97, 61), ResizeToFill(83, 59),
+                  Thumbnail(width=71)]
+    sizes = [(1003, 667), (997, 331), (641, 1279), (1001, 999), (403, 1201)]
+    for format in ('JPEG', 'PNG'):
+        for size in sizes:
+            for processor in processors:
+                class Spec(ImageSpec):
+                    pass
+                Spec.processors = [processor]
+                source = create_source(size, format)
+                settings.IMAGEKIT_SHRINK_ON_LOAD = False
+                expected = Image.open(Spec(source=source).generate()).size
+                settings.IMAGEKIT_SHRINK_ON_LOAD = True
+                source.seek(0)
+                assert Image.open(Spec(source=source).generate()).size == \
+                    expected, (format, size, processor)
+
+
+def test_shared_source_is_decoded_once():
+    class Small(ImageSpec):
+        processors = [ResizeToFit(100, 100)]
+
+    class Large(ImageSpec):
+        processors = [Transpose(), ResizeToFit(400, 400)]
+
+    source = create_source((2000, 1000), 'JPEG')
+    specs = [Small(source=source), Large(source=source)]
+    with mock.patch('imagekit.decoding.open_image',
+                    wraps=open_image) as open_image_mock:
+        with share_source(source, specs):
+            sizes = [Image.open(spec.generate()).size for spec in specs]
+    assert open_image_mock.call_count == 1
+    assert sizes == [(100, 50), (400, 200)]
+
+
+def test_shared_source_respects_other_specs():
+    """
+    Specs that use a shared source but weren't taken into account when
+    deciding how much to shrink it must still get a big enough image.
+
+    """
+    class Small(ImageSpec):
+        processors = [ResizeToFit(100, 100)]
+
+    class Large(ImageSpec):
+        processors = [ResizeToFit(800, 800, upscale=False)]
+
+    source = create_source((2000, 1000), 'JPEG')
+    small, large = Small(source=source), Large(source=source)
+    with share_source(source, [small]):
+        small.generate()
+        assert Image.open(large.generate()).size == (800, 400)
+
+
+def test_shared_prefixes_are_processed_once():
+    counting = CountingProcessor()
+
+    class First(ImageSpec):
+        processors = [counting, ResizeToFit(200, 200), ResizeToFill(50, 50)]
+
+    class Second(ImageSpec):
+        processors = [counting, ResizeToFit(200, 200)]
+        format = 'PNG'
+
+    source = create_source((400, 200), 'JPEG')
+    specs = [First(source=source), Second(source=source)]
+    with share_source(source, specs):
+        images = [Image.open(spec.generate()) for spec in specs]
+    assert CountingProcessor.count == 1
+    assert [(img.size, img.format) for img in images] == [
+        ((50, 50), 'JPEG'), ((200, 100), 'PNG')]
+    assert len(intermediate_cache) == 0
+
+
+class Fill:
+    def __init__(self, color):
+        self._color = color
+
+    def process(self, img):
+        return Image.new(img.mode, img.size, self._color)
+
+
+def test_prefixes_of_differently_configured_processors_are_not_shared():
+    class Red(ImageSpec):
+        processors = [Fill('red')]
+        format = 'PNG'
+
+    class Blue(ImageSpec):
+        processors = [Fill('blue')]
+        format = 'PNG'
+
+    source = create_source((40, 20), 'PNG')
+    specs = [Red(source=source), Blue(source=source)]
+    with share_source(source, specs):
+        colors = [Image.open(spec.generate()).getpixel((0, 0))
+                  for spec in specs]
+    assert colors == [(255, 0, 0), (0, 0, 255)]
@@ -9,7 +9,7 @@ from imagekit.processors import SmartCrop
 from . import imagegenerators  # noqa
 from .models import (ImageModel, ProcessedImageFieldModel,
                      ProcessedImageFieldWithSpecModel)
-from .utils import get_image_file
+from .utils import create_photo, get_image_file
 
 
 @pytest.mark.django_db(transaction=True)
@@ -55,3 +55,15 @@ def test_form_processedimagefield():
 
     assert instance.image.width == 50
     assert instance.image.height == 50
+
+
+@pytest.mark.django_db(transaction=True)
+def test_imagespecfield_reuses_cachefile():
+    photo = create_photo('reuse.jpg')
+    file = photo.thumbnail
+    assert photo.thumbnail is file
+
+    with File(get_image_file()) as image:
+        photo.original_image.save('reuse2.jpg', image, save=False)
+    assert photo.thumbnail is not file
+    assert photo.thumbnail.name != file.name
@@ -0,0 +1,122 @@
+import json
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from imagekit.cachefiles import ImageCacheFile
+
+from .utils import clear_imagekit_cache, create_photo
+
+
+def generateimages(*args):
+    out = StringIO()
+    call_command('generateimages', 'tests:photo', *args, stdout=out)
+    return out.getvalue()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_parallel_output_matches_serial_output():
+    for i in range(5):
+        create_photo('generateimages%s.jpg' % i)
+
+    clear_imagekit_cache()
+    serial = generateimages()
+    clear_imagekit_cache()
+    parallel = generateimages('--jobs', '3', '--chunk-size', '2')
+
+    assert parallel == serial
+    assert serial.count('Validating generator') == 2
+    assert serial.count('.jpg') == 10
+    assert 'Failed' not in serial
+
+
+@pytest.mark.django_db(transaction=True)
+def test_list_storage():
+    create_photo('generateimages.jpg')
+    clear_imagekit_cache()
+    assert generateimages('--list-storage') == generateimages()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_resume(tmp_path):
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    photos = [create_photo('generateimages%s.jpg' % i) for i in range(2)]
+    clear_imagekit_cache()
+
+    output = generateimages('--checkpoint', checkpoint)
+    assert output.count('.jpg') == 4
+    with open(checkpoint) as f:
+        positions = json.load(f)['generators']
+    assert positions['tests:photo:thumbnail'] == {'tests.Photo': photos[-1].pk}
+
+    # Nothing is left to process...
+    output = generateimages('--checkpoint', checkpoint, '--resume')
+    assert output.count('.jpg') == 0
+
+    # ...until new instances are added.
+    create_photo('generateimages2.jpg')
+    output = generateimages('--checkpoint', checkpoint, '--resume')
+    assert output.count('.jpg') == 2
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('args', [(), ('--jobs', '2', '--chunk-size', '2')])
+def test_resume_retries_failed_files(tmp_path, args):
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    photos = [create_photo('generateimages%s.jpg' % i) for i in range(3)]
+    failing = photos[1].original_image.name
+    clear_imagekit_cache()
+
+    generate = ImageCacheFile._generate
+
+    def fail_for_one_source(self):
+        if self.generator.source.name == failing:
+            raise OSError('Storage unavailable')
+        return generate(self)
+
+    with mock.patch.object(ImageCacheFile, '_generate', fail_for_one_source):
+        output = generateimages('--checkpoint', checkpoint, *args)
+    assert output.count('Failed') == 2
+    with open(checkpoint) as f:
+        positions = json.load(f)['generators']
+    assert positions['tests:photo:thumbnail'] == {'tests.Photo': photos[0].pk}
+
+    # Forget the failures, so that they're retried right away.
+    clear_imagekit_cache()
+    output = generateimages('--checkpoint', checkpoint, '--resume', *args)
+    assert output.count('.jpg') == 4
+    assert 'Failed' not in output
+    with open(checkpoint) as f:
+        positions = json.load(f)['generators']
+    assert positions['tests:photo:thumbnail'] == {'tests.Photo': photos[-1].pk}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_since():
+    photos = [create_photo('generateimages%s.jpg' % i) for i in range(3)]
+    clear_imagekit_cache()
+    assert generateimages('--since', str(photos[0].pk)).count('.jpg') == 4
+    assert generateimages('--since', '2999-01-01').count('.jpg') == 0
+    assert generateimages('--since', '2000-01-01').count('.jpg') == 6
+    with pytest.raises(CommandError):
+        generateimages('--since', 'yesterday')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_shards():
+    for i in range(5):
+        create_photo('generateimages%s.jpg' % i)
+    clear_imagekit_cache()
+
+    names = set()
+    for i in range(1, 4):
+        output = generateimages('--shard', '%s/3' % i)
+        shard_names = {line.strip() for line in output.splitlines()
+                       if line.endswith('.jpg')}
+        assert not names & shard_names
+        names |= shard_names
+    assert len(names) == 10
+    with pytest.raises(CommandError):
+        generateimages('--shard', '4/3')
@@ -0,0 +1,198 @@
+import threading
+
+import pytest
+from django.test import override_settings
+from PIL import Image
+
+from imagekit import ImageSpec, hashers
+from imagekit.processors import Adjust, ResizeToFill, Transpose
+
+from .utils import get_image_file
+
+
+class HashedSpec(ImageSpec):
+    processors = [Adjust(contrast=1.2), ResizeToFill(50, 50, anchor='tl')]
+    format = 'JPEG'
+    options = {'quality': 90, 'optimize': True}
+
+
+def legacy_hash(spec):
+    return hashers.pickle([
+        spec.source.name,
+        spec.processors,
+        spec.format,
+        spec.options,
+        spec.autoconvert,
+    ])
+
+
+@pytest.mark.parametrize('name', [
+    'photos/a.jpg', 'with space.png', 'back\\slash.jpg', 'new\nline.jpg',
+    'ünïcödé/☃.jpg', '',
+])
+def test_pickle_template(name):
+    items = [None, HashedSpec.processors, 'JPEG', {'b': 1, 'a': {2, 1}}, True]
+    template = hashers.PickleTemplate(items)
+    assert template.hash(name) == hashers.pickle([name] + items[1:])
+
+
+def test_hash_is_unchanged():
+    with get_image_file() as source:
+        spec = HashedSpec(source=source)
+        assert spec.get_hash() == legacy_hash(spec)
+
+
+def test_hash_template_is_cached_on_class():
+    with get_image_file() as source:
+        HashedSpec(source=source).get_hash()
+        template = HashedSpec.__dict__['_hash_template']
+        HashedSpec(source=source).get_hash()
+        assert HashedSpec.__dict__['_hash_template'] is template
+
+
+def test_reassigned_attributes_change_hash():
+    with get_image_file() as source:
+        spec = HashedSpec(source=source)
+        original_hash = spec.get_hash()
+        spec.format = 'PNG'
+        assert spec.get_hash() != original_hash
+        assert spec.get_hash() == legacy_hash(spec)
+
+
+def test_reassigned_attributes_with_reused_ids_change_hash():
+    """
+    Freed values' ids can be reused by new ones, so they must not identify
+    the cached template.
+
+    """
+    with get_image_file() as source:
+        spec = HashedSpec(source=source)
+        for size in range(1, 50):
+            spec.processors = [ResizeToFill(size, size)]
+            spec.get_hash()
+            # The list of the previous iteration is freed here, so the next
+            # one is likely to get the id of the one that was hashed.
+            spec.processors = [ResizeToFill(size, 1)]
+            spec.processors = [ResizeToFill(1, size)]
+            assert spec.get_hash() == legacy_hash(spec)
+
+
+def test_invalidate_hash():
+    with get_image_file() as source:
+        spec = HashedSpec(source=source)
+        spec.processors = [ResizeToFill(10, 10)]
+        original_hash = spec.get_hash()
+        spec.processors.append(Adjust(color=0))
+        assert spec.get_hash() == original_hash
+        spec.invalidate_hash()
+        assert spec.get_hash() == legacy_hash(spec)
+
+
+def test_dynamic_specs_are_not_cached():
+    class DynamicSpec(ImageSpec):
+        @property
+        def processors(self):
+            return [ResizeToFill(self.size, self.size)]
+
+    with get_image_file() as source:
+        spec = DynamicSpec(source=source)
+        spec.size = 10
+        first_hash = spec.get_hash()
+        spec.size = 20
+        assert spec.get_hash() != first_hash
+        assert spec.get_hash() == legacy_hash(spec)
+
+
+@pytest.mark.parametrize('name', ['photos/a.jpg', 'quo"te.jpg', 'ünïcödé.jpg'])
+def test_canonical_template(name):
+    items = [None, HashedSpec.processors, 'JPEG', {'b': 1, 'a': {2, 1}}, True]
+    template = hashers.CanonicalTemplate(items)
+    assert template.hash(name) == hashers.canonical([name] + items[1:])
+
+
+def test_canonical_ignores_defaults():
+    assert (hashers.canonical(ResizeToFill(50, 50))
+            == hashers.canonical(ResizeToFill(50, 50, anchor=None,
+                                              upscale=True)))
+    assert (hashers.canonical(ResizeToFill(50, 50))
+            != hashers.canonical(ResizeToFill(50, 50, upscale=False)))
+
+
+def test_canonical_distinguishes_var_args():
+    assert (hashers.canonical(Transpose(Transpose.ROTATE_90))
+            != hashers.canonical(Transpose(Transpose.ROTATE_180)))
+
+
+def test_canonical_is_order_independent():
+    assert (hashers.canonical({'a': 1, 'b': {1, 2}})
+            == hashers.canonical({'b': {2, 1}, 'a': 1}))
+
+
+def test_canonical_is_stable():
+    """
+    The canonical hash must not change between versions; if this test fails,
+    every cache file named with it would be regenerated.
+
+    """
+    assert hashers.canonical_dumps(ResizeToFill(50, 40, anchor='tl')) == (
+        b'{"__class__":"pilkit.processors.resize.ResizeToFill",'
+        b'"params":{"anchor":"tl","height":40,"width":50}}')
+
+
+def test_canonical_distinguishes_modules():
+    def make_processor(module):
+        def __init__(self, size):
+            self.size = size
+        return type('Watermark', (), {'__module__': module,
+                                      '__init__': __init__})
+
+    a, b = make_processor('myapp.a'), make_processor('myapp.b')
+    assert hashers.canonical(a(1)) != hashers.canonical(b(1))
+    assert hashers.canonical(a(1)) != hashers.canonical(a(2))
+
+    # Classes can keep their name when they're moved.
+    a.hash_name = b.hash_name = 'myapp.Watermark'
+    assert hashers.canonical(a(1)) == hashers.canonical(b(1))
+
+
+def test_canonical_distinguishes_private_state():
+    """
+    Objects whose attributes aren't exactly their constructor's parameters
+    are described by all of their attributes.
+
+    """
+    class Watermark:
+        def __init__(self, size):
+            self._size = size
+
+    class Slotted:
+        __slots__ = ('__size',)
+
+        def __init__(self, size):
+            self.__size = size
+
+    assert hashers.canonical(Watermark(1)) != hashers.canonical(Watermark(2))
+    assert hashers.canonical(Slotted(1)) != hashers.canonical(Slotted(2))
+
+
+def test_canonical_distinguishes_images():
+    red = Image.new('RGB', (10, 10), 'red')
+    blue = Image.new('RGB', (10, 10), 'blue')
+    assert hashers.canonical(red) != hashers.canonical(blue)
+    assert hashers.canonical(red) == hashers.canonical(red.copy())
+
+
+def test_canonical_rejects_unknown_state():
+    with pytest.raises(TypeError):
+        hashers.canonical(threading.Lock())
+
+
+def test_spec_hasher_setting():
+    with get_image_file() as source:
+        spec = HashedSpec(source=source)
+        with override_settings(
+                IMAGEKIT_SPEC_HASHER='imagekit.hashers.canonical'):
+            assert spec.get_hash() == hashers.canonical([
+                spec.source.name, spec.processors, spec.format, spec.options,
+                spec.autoconvert])
+        assert spec.get_hash() == legacy_hash(spec)
@@ -0,0 +1,67 @@
+from unittest import mock
+
+import pytest
+
+from imagekit.cachefiles.backends import CacheFileState
+from imagekit.models import prefetch_imagekit
+
+from .models import Photo
+from .utils import DummyAsyncCacheFileBackend, create_photo
+
+
+@pytest.mark.django_db(transaction=True)
+def test_prefetch_imagekit():
+    pks = []
+    for i in range(3):
+        photo = create_photo('prefetch%s.jpg' % i)
+        photo.thumbnail.generate()
+        pks.append(photo.pk)
+    photos = prefetch_imagekit(Photo.objects.filter(pk__in=pks), 'thumbnail')
+    assert len(photos) == 3
+
+    for photo in photos:
+        file = photo.__dict__['thumbnail']
+        assert file._cachefile_state == CacheFileState.EXISTS
+        backend = file.cachefile_backend
+        with mock.patch.object(backend, '_get_cached',
+                               wraps=backend._get_cached) as get_cached:
+            assert photo.thumbnail is file
+            photo.thumbnail.url
+        assert not get_cached.called
+
+
+@pytest.mark.django_db(transaction=True)
+def test_prefetch_imagekit_schedules_missing_files():
+    photo = create_photo('prefetch.jpg')
+    backend = DummyAsyncCacheFileBackend()
+    with mock.patch.object(DummyAsyncCacheFileBackend, 'generate') as generate, \
+            mock.patch('imagekit.specs.get_default_cachefile_backend',
+                       return_value=backend):
+        prefetch_imagekit(Photo.objects.filter(pk=photo.pk), 'thumbnail',
+                          'smartcropped_thumbnail')
+    assert generate.call_count == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_queryset_prefetch_imagekit():
+    create_photo('prefetch.jpg')
+    queryset = Photo.objects.prefetch_imagekit('thumbnail').filter(pk__gt=0)
+    with mock.patch('imagekit.models.query.prefetch_imagekit') as prefetch:
+        photos = list(queryset)
+        list(queryset)
+    assert prefetch.call_count == 1
+    assert prefetch.call_args[0] == (photos, 'thumbnail')
+    assert not Photo.objects.prefetch_imagekit('thumbnail') \
+        .prefetch_imagekit(None)._imagekit_fields
+
+
+@pytest.mark.django_db(transaction=True)
+def test_prefetch_imagekit_does_not_generate_synchronously():
+    photo = create_photo('prefetch.jpg')
+    backend = photo.thumbnail.cachefile_backend
+    backend.cache.clear()
+    with mock.patch.object(type(backend), 'generate') as generate:
+        photos = prefetch_imagekit(Photo.objects.filter(pk=photo.pk),
+                                   'thumbnail')
+    assert not generate.called
+    assert len(photos) == 1
@@ -0,0 +1,33 @@
+from unittest import mock
+
+import pytest
+from django.template import Context, Template, TemplateSyntaxError
+
+from .utils import create_photo
+
+
+def render(ttag, context):
+    return Template('{%% load imagekit %%}%s' % ttag).render(Context(context))
+
+
+@pytest.mark.django_db(transaction=True)
+def test_primeimages_attrs():
+    photos = [create_photo('primeimages%s.jpg' % i) for i in range(2)]
+    with mock.patch('imagekit.templatetags.imagekit.prime_cachefiles') as prime:
+        assert render("{% primeimages photos 'thumbnail' %}",
+                      {'photos': photos}) == ''
+    assert [f.name for f in prime.call_args[0][0]] == [
+        p.thumbnail.name for p in photos]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_primeimages_files():
+    files = [create_photo('primeimages.jpg').thumbnail]
+    with mock.patch('imagekit.templatetags.imagekit.prime_cachefiles') as prime:
+        render('{% primeimages files %}', {'files': files})
+    assert list(prime.call_args[0][0]) == files
+
+
+def test_primeimages_requires_items():
+    with pytest.raises(TemplateSyntaxError):
+        render('{% primeimages %}', {})
@@ -0,0 +1,94 @@
+from unittest import mock
+
+from django.dispatch import Signal
+
+from imagekit.cachefiles import ImageCacheFile
+from imagekit.registry import (CacheFileRegistry, generator_registry,
+                               register, unregister)
+from imagekit.signals import existence_required
+
+from .imagegenerators import SolidColor
+from .models import CountingCacheFileStrategy
+
+
+def make_file(generator):
+    strategy = CountingCacheFileStrategy()
+    return ImageCacheFile(generator, cachefile_strategy=strategy), strategy
+
+
+def test_registered_class_receives_signals():
+    file, strategy = make_file(generator_registry.get('solidcolor'))
+    existence_required.send(sender=None, file=file)
+    assert strategy.on_existence_required_count == 1
+
+
+def test_unregistered_class_ignores_signals():
+    file, strategy = make_file(SolidColor())
+    register.generator('test:registry:solidcolor', SolidColor)
+    unregister.generator('test:registry:solidcolor')
+    existence_required.send(sender=None, file=file)
+    # SolidColor is still registered with another id.
+    assert strategy.on_existence_required_count == 1
+
+    class OtherColor(SolidColor):
+        pass
+
+    register.generator('test:registry:othercolor', OtherColor)
+    unregister.generator('test:registry:othercolor')
+    file, strategy = make_file(OtherColor())
+    existence_required.send(sender=None, file=file)
+    assert strategy.on_existence_required_count == 0
+
+
+def test_registered_callable_receives_signals():
+    class CallableColor(SolidColor):
+        pass
+
+    def make_generator(**kwargs):
+        return CallableColor(**kwargs)
+
+    register.generator('test:registry:callable', make_generator)
+    try:
+        generator = generator_registry.get('test:registry:callable')
+        file, strategy = make_file(generator)
+        existence_required.send(sender=None, file=file)
+        assert strategy.on_existence_required_count == 1
+    finally:
+        unregister.generator('test:registry:callable')
+    existence_required.send(sender=None, file=file)
+    assert strategy.on_existence_required_count == 1
+
+
+def test_cachefile_registry():
+    registry = CacheFileRegistry()
+    a, b = (lambda: iter(['a'])), (lambda: iter(['b']))
+    registry.register('x', a)
+    registry.register('x', b)
+    registry.register('y', b)
+    assert list(registry.get('x')) == ['a', 'b']
+    assert list(registry.get('y')) == ['b']
+    registry.unregister('x', a)
+    assert list(registry.get('x')) == ['b']
+    assert list(registry.get('z')) == []
+
+
+def test_direct_signal_dispatch():
+    file, strategy = make_file(generator_registry.get('solidcolor'))
+    with mock.patch.object(Signal, 'send') as send:
+        existence_required.send(sender=None, file=file)
+    assert not send.called
+    assert strategy.on_existence_required_count == 1
+
+    # Other receivers are still called when they're connected.
+    receiver = mock.Mock()
+    existence_required.connect(receiver)
+    try:
+        existence_required.send(sender=None, file=file)
+    finally:
+        existence_required.disconnect(receiver)
+    assert receiver.call_count == 1
+    assert strategy.on_existence_required_count == 2
+
+    existence_required.send(sender=None, file=file)
+    assert receiver.call_count == 1
+    assert strategy.on_existence_required_count == 3
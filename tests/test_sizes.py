@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+from imagekit import ImageSpec
+from imagekit.cachefiles import ImageCacheFile
+from imagekit.processors import (AddBorder, Adjust, Crop, ProcessorPipeline,
+                                 Reflection, Resize, ResizeCanvas,
+                                 ResizeToCover, ResizeToFill, ResizeToFit,
+                                 SmartCrop, SmartResize, Thumbnail, Transpose,
+                                 TrimBorderColor)
+from imagekit.sizes import get_output_size
+
+from .utils import DummyAsyncCacheFileBackend
+
+
+@pytest.mark.parametrize('processors', [
+    [Resize(100, 50)],
+    [Resize(500, 500, upscale=False)],
+    [ResizeToCover(100, 100)],
+    [ResizeToFill(100, 50)],
+    [ResizeToFill(500, 500, upscale=False)],
+    [SmartResize(100, 50)],
+    [ResizeToFit(100, 100)],
+    [ResizeToFit(height=77)],
+    [ResizeToFit(100, 100, mat_color=(0, 0, 0))],
+    [ResizeToFit(500, 500, upscale=False)],
+    [Thumbnail(100, 100)],
+    [Thumbnail(width=100)],
+    [Crop(100, 500)],
+    [SmartCrop(100, 100)],
+    [ResizeCanvas(500, 100)],
+    [AddBorder((1, 2, 3, 4))],
+    [Reflection(size=0.3)],
+    [Transpose(Transpose.ROTATE_90), ResizeToFit(50)],
+    [ProcessorPipeline([Adjust(contrast=1.2), ResizeToFill(30, 40)])],
+])
+@pytest.mark.parametrize('size', [(300, 200), (123, 457)])
+def test_output_size_matches_processing(processors, size):
+    img = Image.new('RGB', size)
+    for processor in processors:
+        img = processor.process(img)
+    assert get_output_size(processors, size) == img.size
+
+
+def test_unknown_output_size():
+    assert get_output_size([TrimBorderColor()], (300, 200)) is None
+    assert get_output_size([Transpose(), ResizeToFill(10, 10)],
+                           (300, 200)) is None
+
+
+def test_output_size_protocol():
+    class Square:
+        def get_output_size(self, size):
+            return min(size), min(size)
+
+    assert get_output_size([Square(), ResizeToFit(50)], (300, 200)) == \
+        (50, 50)
+
+
+class FillSpec(ImageSpec):
+    processors = [ResizeToFill(100, 50)]
+
+
+def test_spec_output_size_from_dimension_fields():
+    source = SimpleNamespace(
+        name='source.jpg',
+        field=SimpleNamespace(width_field='width', height_field='height'),
+        instance=SimpleNamespace(width=800, height=600))
+    spec = FillSpec(source=source)
+    assert spec.get_source_size() == (800, 600)
+    assert spec.get_output_size() == (100, 50)
+
+    source.instance.width = None
+    assert spec.get_output_size() is None
+
+
+def test_cachefile_dimensions_are_predicted():
+    source = SimpleNamespace(name='source.jpg', _dimensions_cache=(400, 300))
+    file = ImageCacheFile(FillSpec(source=source), name='predicted.jpg',
+                          cachefile_backend=DummyAsyncCacheFileBackend())
+    assert (file.width, file.height) == (100, 50)
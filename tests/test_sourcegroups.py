@@ -1,11 +1,14 @@
 import pytest
 from django.core.files import File
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from imagekit.signals import source_saved
-from imagekit.specs.sourcegroups import ImageFieldSourceGroup
+from imagekit.specs.sourcegroups import ImageFieldSourceGroup, ModelSignalRouter
 
-from .models import AbstractImageModel, ConcreteImageModel, ImageModel
-from .utils import get_image_file
+from .models import (AbstractImageModel, ConcreteImageModel,
+                     ConcreteImageModelSubclass, ImageModel)
+from .utils import create_photo, get_image_file
 
 
 def make_counting_receiver(source_group):
@@ -60,3 +63,98 @@ def test_abstract_model_signals():
     with File(get_image_file(), name='reference.png') as image:
         ConcreteImageModel.objects.create(original_image=image)
     assert receiver.count == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_files_are_read_in_chunks():
+    """
+    Only the primary key and the image field of the instances with an image
+    are read, a chunk at a time.
+
+    """
+    photos = [create_photo('sourcegroups%s.jpg' % i) for i in range(5)]
+    photos[0].original_image = ''
+    photos[0].save()
+    source_group = ImageFieldSourceGroup(type(photos[0]), 'original_image')
+    source_group.chunk_size = 2
+
+    with CaptureQueriesContext(connection) as queries:
+        files = list(source_group.files())
+
+    assert [file.name for file in files] == [
+        photo.original_image.name for photo in photos[1:]]
+    assert files[0].instance.pk == photos[1].pk
+    # Two full chunks, and an empty one.
+    assert len(queries) == 3
+
+
+def test_model_signal_router_cache():
+    """
+    The source groups of each model are cached until another source group is
+    added.
+
+    """
+    router = ModelSignalRouter()
+    router.add(ImageFieldSourceGroup(AbstractImageModel, 'original_image'))
+    assert router.get_source_groups(ImageModel) == ()
+    assert router.get_source_fields(ConcreteImageModel()) == {'original_image'}
+
+    router.add(ImageFieldSourceGroup(ImageModel, 'image'))
+    assert [src.image_field for src in router.get_source_groups(ImageModel)] == ['image']
+    assert router.get_source_fields(ImageModel()) == {'image'}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_source_names_are_captured_lazily():
+    """
+    Loading an instance doesn't create ``FieldFile`` objects for its sources,
+    and saving it only dispatches the source_saved signal if they changed.
+
+    """
+    source_group = ImageFieldSourceGroup(ImageModel, 'image')
+    receiver = make_counting_receiver(source_group)
+    source_saved.connect(receiver)
+    with File(get_image_file(), name='reference.png') as image:
+        pk = ImageModel.objects.create(image=image).pk
+    assert receiver.count == 1
+
+    instance = ImageModel.objects.get(pk=pk)
+    assert isinstance(instance.__dict__['image'], str)
+    instance.save()
+    assert receiver.count == 1
+
+    with File(get_image_file(), name='reference.png') as image:
+        instance.image.save('other.png', image)
+    assert receiver.count == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_files_of_multi_table_inheritance_children():
+    """
+    The files of models whose primary key isn't their first field (like
+    multi-table inheritance children) are read correctly.
+
+    """
+    with File(get_image_file(), name='reference.png') as image:
+        instance = ConcreteImageModelSubclass.objects.create(
+            original_image=image)
+    source_group = ImageFieldSourceGroup(AbstractImageModel, 'original_image')
+    files = [file for file in source_group.files()
+             if isinstance(file.instance, ConcreteImageModelSubclass)]
+    assert [file.name for file in files] == [instance.original_image.name]
+    assert files[0].instance.pk == instance.pk
+
+
+@pytest.mark.django_db(transaction=True)
+def test_source_saved_signal_for_existing_file_names():
+    """
+    Creating an instance whose source name doesn't change when it's saved
+    (e.g. a file that's already stored) still dispatches the source_saved
+    signal.
+
+    """
+    source_group = ImageFieldSourceGroup(ImageModel, 'image')
+    receiver = make_counting_receiver(source_group)
+    source_saved.connect(receiver)
+    ImageModel.objects.create(image='b/existing.png')
+    assert receiver.count == 1